@@ -1,21 +1,136 @@
+import argparse
+import asyncio
+import json
+import sys
 
+from .bytecode import compile_program
+from .cache import FrontendCache
+from .diagnostics import DiagnosticSink
 from .info import SourceCode
 from .lexer import tokenize
-from .parse import build_ast  # type: ignore shadowedImport(stdlib.parser)
-from .walker import check_type
+from .parse import build_ast
+from .project import FileResult, expand, iter_project
+from .server import serve_stdio
+from .stats import Stats
+from .vm import ExecutionError, Machine
 
 
-def main(filepath: str):
-    code = SourceCode(filepath, None)
-    with open(filepath, "rt", encoding="utf-8") as f:
-        code.text = f.read()
+def main(paths: list[str], jobs: int = None, cache_dir: str = None, stats: bool = False, output: str = "text",
+         max_errors: int = None) -> int:
+    # compiles all paths in this process (and its workers), diagnostics are written as the files finish
+    emit = emit_json if output == "json" else emit_text
+    files = tokens = nodes = errors = 0
+    total = Stats() if stats else None
+    timings: list[tuple[float, str]] = []
 
-    lex_result = tokenize(code)
-    #print(lex_result, )
+    results = iter_project(paths, jobs, cache_dir, stats, max_errors)  # no file reads on past max_errors
+    for result in results:
+        files += 1
+        tokens += result.tokens
+        nodes += result.nodes
+        if result.stats:
+            total.merge(result.stats)
+            timings.append((result.stats.total, result.path))
 
-    parse_result = build_ast(lex_result)
-    print(parse_result)
+        reported = [None] if result.error else []
+        reported += result.diagnostics
+        if max_errors is not None:
+            reported = reported[:max_errors - errors]
+        for diagnostic in reported:
+            emit(result, diagnostic)
+        errors += len(reported)
+        if max_errors is not None and errors >= max_errors:
+            results.close()
+            break
+    sys.stdout.flush()
 
-    #type_result = check_type(parse_result.ast)
+    summary = f"{files} files, {tokens} tokens, {nodes} nodes, {errors} diagnostics"
+    if max_errors is not None and errors >= max_errors:
+        summary += f" (stopped at --max-errors {max_errors})"
+    print(summary, file=sys.stderr if output == "json" else sys.stdout)
+    if stats:
+        total.report()
+        print("slowest files:", file=sys.stderr)
+        for seconds, path in sorted(timings, reverse=True)[:10]:
+            print(f"  {seconds * 1e3:10.2f} ms  {path}", file=sys.stderr)
+    return 1 if errors else 0
 
-main("biskuit/test.bs")
\ No newline at end of file
+
+def run(path: str, function: str) -> int:
+    # compiles one module to bytecode and calls function without arguments, its result is printed
+    code = SourceCode.map(path)
+    sink = DiagnosticSink()
+    parse_result = build_ast(tokenize(code, sink=sink), sink=sink)
+    program = compile_program(parse_result.ast)
+    for diagnostic in sink.diagnostics + program.diagnostics:
+        location = code.location(diagnostic.range.start)
+        print(f"{path}:{location.line + 1}:{location.column + 1}: {diagnostic.type.name}", file=sys.stderr)
+    try:
+        result = Machine(program).call(function)
+    except ExecutionError as e:
+        where = f"{path}:{code.location(e.offset).line + 1}" if e.offset is not None else path
+        print(f"{where}: {e.function or function}: {e}", file=sys.stderr)
+        return 1
+    if result is not None:
+        print(result)
+    return 0
+
+
+def emit_text(result: FileResult, diagnostic: tuple | None):
+    if diagnostic is None:
+        print(f"{result.path}: error: {result.error}")
+        return
+    type, start, _ = diagnostic
+    location = result.location(start)
+    print(f"{result.path}:{location.line + 1}:{location.column + 1}: {type.name}")
+
+
+def emit_json(result: FileResult, diagnostic: tuple | None):
+    # one object per line; range holds offsets into the file, line and column of its start count from 1
+    if diagnostic is None:
+        record = {"path": result.path, "error": result.error}
+    else:
+        type, start, end = diagnostic
+        location = result.location(start)
+        record = {
+            "path": result.path, "type": type.name, "range": {"start": start, "end": end},
+            "line": location.line + 1, "column": location.column + 1,
+        }
+    print(json.dumps(record, separators=(",", ":")))
+
+
+def cli(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog="biskuit")
+    parser.add_argument("paths", nargs="*", metavar="PATH", help="files, directories (searched for .bs modules) or globs")
+    parser.add_argument("--jobs", type=int, help="worker processes, or for one file lexing workers, defaults to the number of cores")
+    parser.add_argument("--format", choices=("text", "json"), default="text", help="diagnostics as path:line:column lines or as JSON lines")
+    parser.add_argument("--max-errors", type=int, metavar="N", help="stop after reporting N diagnostics")
+    parser.add_argument("--lsp", action="store_true", help="run as a language server on stdin/stdout")
+    parser.add_argument("--debounce", type=float, default=0.005, help="seconds of quiet before --lsp re-checks a changed document")
+    parser.add_argument("--index", metavar="FILE", help="keep the --lsp workspace symbol index in FILE across sessions")
+    parser.add_argument("--run", metavar="FUNCTION", help="compile the one PATH to bytecode and call FUNCTION")
+    parser.add_argument("--stats", action="store_true", help="print per-phase timings and token/node/diagnostic counts to stderr")
+    parser.add_argument("--cache-dir", help="reuse lex/parse results of unchanged sources from this directory")
+    parser.add_argument("--cache-max-mb", type=int, default=512)
+    parser.add_argument("--cache-max-days", type=float, default=30)
+    args = parser.parse_args(argv)
+
+    if args.lsp:
+        asyncio.run(serve_stdio(args.debounce, args.index))
+        return 0
+    paths = expand(args.paths)
+    if not paths:
+        parser.error("no .bs files found" if args.paths else "no paths given")
+    if args.run:
+        if len(paths) != 1:
+            parser.error("--run takes exactly one module")
+        return run(paths[0], args.run)
+
+    status = main(paths, args.jobs, args.cache_dir, args.stats, args.format, args.max_errors)
+    if args.cache_dir:
+        FrontendCache(args.cache_dir, args.cache_max_mb << 20, args.cache_max_days * 24 * 3600).evict()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,160 @@
+from array import array
+from functools import cache
+
+from .info import SourceRange
+from .nodes import FieldKind, Node, NodeType, field_kinds
+
+Kinds = tuple(dict.fromkeys(value for name, value in vars(NodeType).items() if not name.startswith("_")))
+KindIds = {kind: idx for idx, kind in enumerate(Kinds)}
+
+
+@cache
+def layout(type: type) -> dict[str, tuple[int, FieldKind]]:
+    # slot of each field relative to the node's first slot, a node list takes two (first child, count)
+    offsets = {}
+    slot = 0
+    for name, kind in field_kinds(type):
+        offsets[name] = (slot, kind)
+        slot += 2 if kind is FieldKind.NodeList else 1
+    return offsets
+
+
+class AstArena():
+    # a whole tree as columns: node i has kind Kinds[kinds[i]], the range starts[i]:ends[i] and its fields in
+    # slots[fields[i]:]; nodes are in breadth first order so the children of a list are one index span
+    __slots__ = ("kinds", "starts", "ends", "fields", "slots", "values")
+
+    def __init__(self):
+        self.kinds = array("B")
+        self.starts = array("I")
+        self.ends = array("I")
+        self.fields = array("I")
+        self.slots = array("i")  # child index, -1 for None, or index into values for plain fields
+        self.values: list = []  # names, paths, docs, ...; equal values are stored once
+
+    @classmethod
+    def from_tree(cls, root: Node) -> "AstArena":
+        arena = cls()
+        kinds, starts, ends, fields, slots, values = arena.kinds, arena.starts, arena.ends, arena.fields, arena.slots, arena.values
+        value_ids: dict = {}
+        queue = [root]
+        for node in queue:
+            kinds.append(KindIds[node.type])
+            starts.append(node.range.start)
+            ends.append(node.range.end)
+            fields.append(len(slots))
+            for name, kind in field_kinds(node.type):
+                value = getattr(node.data, name)
+                if value is None:
+                    slots.append(-1)
+                    if kind is FieldKind.NodeList:
+                        slots.append(0)
+                elif kind is FieldKind.Node:
+                    slots.append(len(queue))
+                    queue.append(value)
+                elif kind is FieldKind.NodeList:
+                    slots.append(len(queue))
+                    slots.append(len(value))
+                    queue.extend(value)
+                else:
+                    key = (type(value), value)  # keeps 1, 1.0 and True apart
+                    if key not in value_ids:
+                        value_ids[key] = len(values)
+                        values.append(value)
+                    slots.append(value_ids[key])
+        return arena
+
+    def to_tree(self) -> Node:
+        kinds, starts, ends, fields, slots, values = self.kinds, self.starts, self.ends, self.fields, self.slots, self.values
+        built = [Node(Kinds[kinds[idx]], SourceRange(starts[idx], ends[idx])) for idx in range(len(kinds))]
+        for idx, (node, base) in enumerate(zip(built, fields)):
+            data = node.data
+            for name, (slot, kind) in layout(node.type).items():
+                value = slots[base + slot]
+                if kind is FieldKind.Node or kind is FieldKind.NodeList:
+                    if 0 <= value <= idx:  # children come after their parent, anything else was not written by from_tree
+                        raise ValueError(f"node {idx} refers back to node {value}")
+                if kind is FieldKind.NodeList:
+                    value = [] if value < 0 else built[value : value + slots[base + slot + 1]]
+                elif value < 0:
+                    value = None
+                elif kind is FieldKind.Node:
+                    value = built[value]
+                else:
+                    value = values[value]
+                setattr(data, name, value)
+        return built[0]
+
+    @property
+    def root(self) -> "NodeView":
+        return NodeView(self, 0)
+
+    def field(self, idx: int, name: str):
+        try:
+            slot, kind = layout(Kinds[self.kinds[idx]])[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        base = self.fields[idx] + slot
+        value = self.slots[base]
+        if kind is FieldKind.NodeList:
+            return [] if value < 0 else [NodeView(self, child) for child in range(value, value + self.slots[base + 1])]
+        if value < 0:
+            return None
+        if kind is FieldKind.Node:
+            return NodeView(self, value)
+        return self.values[value]
+
+    @property
+    def nbytes(self):
+        return sum(column.itemsize * len(column) for column in (self.kinds, self.starts, self.ends, self.fields, self.slots))
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __repr__(self):
+        return f"AstArena(nodes={len(self)}, nbytes={self.nbytes}, values={len(self.values)})"
+
+
+class NodeView():
+    # read only stand-in for a Node: same type, data and range attributes, backed by an arena row
+    __slots__ = ("arena", "idx")
+
+    def __init__(self, arena: AstArena, idx: int):
+        self.arena = arena
+        self.idx = idx
+
+    @property
+    def type(self):
+        return Kinds[self.arena.kinds[self.idx]]
+
+    @property
+    def data(self):
+        return DataView(self.arena, self.idx)
+
+    @property
+    def range(self):
+        return SourceRange(self.arena.starts[self.idx], self.arena.ends[self.idx])
+
+    def __eq__(self, other):
+        return isinstance(other, NodeView) and other.arena is self.arena and other.idx == self.idx
+
+    def __hash__(self):
+        return hash((id(self.arena), self.idx))
+
+    def __repr__(self):
+        return f"NodeView(type={self.type.__name__}, idx={self.idx}, range={self.range})"
+
+
+class DataView():
+    __slots__ = ("arena", "idx")
+
+    def __init__(self, arena: AstArena, idx: int):
+        self.arena = arena
+        self.idx = idx
+
+    def __getattr__(self, name: str):
+        return self.arena.field(self.idx, name)
+
+    def __repr__(self):
+        type = Kinds[self.arena.kinds[self.idx]]
+        return f"{type.__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name, _ in field_kinds(type))})"
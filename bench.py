@@ -0,0 +1,280 @@
+import argparse
+import gc
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections.abc import Iterator
+from pathlib import Path
+
+from .info import SourceCode
+from .lexer import LexEngine, tokenize
+from .nodes import iter_tree
+from .parse import build_ast
+
+BENCH_VERSION = 1  # bump when the result layout changes
+
+Binary = ["+", "-", "*", "/", "%", "&", "&&", "|", "||", "^", "<<", "<<<", ">>", ">>>",
+          "==", "!=", "<", "<=", ">", ">=", "and", "or"]
+Compound = ["=", "+=", "-=", "*=", "/=", "%=", "&=", "&&=", "|=", "||=", "^=",
+            "<<=", "<<<=", ">>=", ">>>="]
+Unary = ["-", "!", "~", "not ", "@", "?"]
+Types = ["i32", "u8", "f32", "[]u8", "Result", "Matrix4f"]
+
+
+def generate(size: int, seed: int = 0, declarations_only: bool = False) -> Iterator[str]:
+    # chunks of at least size bytes in total built from the constructs of test.bs, same seed same text;
+    # declarations_only keeps to imports and typed definitions, a corpus without values or bodies
+    rng = random.Random(seed)
+    counter = 0
+
+    def name(prefix: str = "x"):
+        nonlocal counter
+        counter += 1
+        return f"{prefix}_{counter}"
+
+    def number():
+        match rng.randrange(5):
+            case 0:
+                return f"0x{rng.randrange(1 << 16):X}"
+            case 1:
+                return f"0b{rng.randrange(1 << 8):b}"
+            case 2:
+                return f"{rng.randrange(1000)}.{rng.randrange(100)}"
+            case _:
+                return str(rng.randrange(1000))
+
+    def expression(depth: int = 0):
+        match rng.randrange(8 if depth < 3 else 3):
+            case 0:
+                return number()
+            case 1:
+                return f'"{name("s")}"'
+            case 2:
+                return name()
+            case 3:
+                return f"{rng.choice(Unary)}{expression(depth + 1)}"
+            case 4:
+                return f"({expression(depth + 1)})"
+            case 5:
+                return f".{name('E').upper()}"
+            case 6:
+                return f"{rng.choice(Types[-2:])}.{{{', '.join(expression(depth + 1) for _ in range(rng.randrange(4)))}}}"
+            case _:
+                return f"{expression(depth + 1)} {rng.choice(Binary)} {expression(depth + 1)}"
+
+    def doc(indent: str = ""):
+        match rng.randrange(4):
+            case 0:
+                return f"{indent}/* {name('doc')} */\n"
+            case 1:
+                return f"{indent}// {name('comment')}\n"
+            case _:
+                return ""
+
+    def function_type():
+        parameters = ", ".join(f"{name('a')}: {rng.choice(Types)}" for _ in range(rng.randrange(4)))
+        return f"({parameters}) -> {rng.choice(Types)}"
+
+    def block(depth: int, indent: str):
+        lines = []
+        for _ in range(rng.randrange(1, 6)):
+            match rng.randrange(5 if depth < 3 else 4):
+                case 0:
+                    lines.append(f"{indent}{name()} := {expression()};")
+                case 1:
+                    lines.append(f"{indent}{name()}: {rng.choice(Types)} = {expression()};")
+                case 2:
+                    lines.append(f"{indent}{name()} {rng.choice(Compound)} {expression()};")
+                case 3:
+                    lines.append(f"{indent}{doc().strip() or '// ...'}")
+                case _:
+                    lines.append(f"{indent}{{\n{block(depth + 1, indent + '    ')}\n{indent}}}")
+        lines.append(f"{indent}return {expression()};")
+        return "\n".join(lines)
+
+    def members(kind: str):
+        if kind == "struct":
+            return "".join(f"    {name('m')}: {rng.choice(Types)};\n" for _ in range(rng.randrange(5)))
+        return "".join(f"    {name('E').upper()} :: {idx};\n" for idx in range(rng.randrange(5)))
+
+    def declaration():
+        match rng.randrange(3):
+            case 0:
+                return f'#import "{name("module")}";\n'
+            case 1:
+                return f"{doc()}{name()}: {rng.choice(Types)};\n"
+            case _:
+                return f"{doc()}{name()} : {rng.choice(Types)};\n\n"
+
+    def construct():
+        match rng.randrange(8):
+            case 0:
+                return declaration()
+            case 1:
+                return f"{doc()}{name('GLOBAL').upper()} :: {expression()};\n"
+            case 2:
+                return f"{doc()}{name()} : {rng.choice(Types)} = {expression()};\n"
+            case 3:
+                return f"{doc()}{name('callback')}: {function_type()};\n"
+            case 4:
+                return f"{doc()}{name('main')} :: {function_type()} {{\n{block(0, '    ')}\n}}\n\n"
+            case 5:
+                return f"{doc()}{name('Struct')} :: struct {{\n{members('struct')}}}\n\n"
+            case 6:
+                return f"{doc()}{name('Enum')} :: enum u8 {{\n{members('enum')}}}\n\n"
+            case _:
+                return f"{doc()}{name()} := {expression()};\n"
+
+    make = declaration if declarations_only else construct
+    written = 0
+    while written < size:
+        chunk = "".join(make() for _ in range(64))
+        written += len(chunk.encode("utf-8"))
+        yield chunk
+
+
+def write_corpus(path: str | Path, size: int, seed: int = 0, declarations_only: bool = False):
+    with open(path, "wt", encoding="utf-8", newline="\n") as f:
+        for chunk in generate(size, seed, declarations_only):
+            f.write(chunk)
+
+
+def parse_size(text: str) -> int:
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    text = text.strip().upper().removesuffix("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def measure(work, repeat: int):
+    # best wall time of repeat runs, then one more run under tracemalloc for the peak (it slows everything down)
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        begin = time.perf_counter()
+        result = work()
+        best = min(best, time.perf_counter() - begin)
+        del result
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = work()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak, result
+
+
+def run(sizes: list[int], engines: list[LexEngine], repeat: int = 3, seed: int = 0, declarations_only: bool = False):
+    results = []
+    for size in sizes:
+        code = SourceCode(f"<bench {size}>", "".join(generate(size, seed, declarations_only)))
+        length = len(code.text.encode("utf-8"))
+
+        lex_result = None
+        for engine in engines:
+            seconds, peak, lex_result = measure(lambda: tokenize(code, engine), repeat)
+            tokens = len(lex_result.tokens)
+            results.append({
+                "phase": "tokenize", "engine": engine.name, "size": size, "bytes": length, "tokens": tokens,
+                "seconds": seconds, "peak_bytes": peak,
+                "bytes_per_sec": length / seconds, "tokens_per_sec": tokens / seconds,
+            })
+
+        result = {"phase": "build_ast", "engine": None, "size": size, "bytes": length, "tokens": len(lex_result.tokens)}
+        try:
+            seconds, peak, parse_result = measure(lambda: build_ast(lex_result), repeat)
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        else:
+            nodes = sum(1 for _ in iter_tree(parse_result.ast))
+            result.update({
+                "nodes": nodes, "seconds": seconds, "peak_bytes": peak,
+                "bytes_per_sec": length / seconds, "tokens_per_sec": result["tokens"] / seconds,
+                "nodes_per_sec": nodes / seconds,
+            })
+        results.append(result)
+    return results
+
+
+def revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=Path(__file__).parent,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.10):
+    # matches results by phase, engine and size; returns the ones that got slower by more than threshold
+    previous = {(r["phase"], r["engine"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        old = previous.get((result["phase"], result["engine"], result["size"]))
+        if old is None or "seconds" not in old or "seconds" not in result:
+            continue
+        ratio = result["bytes_per_sec"] / old["bytes_per_sec"]
+        print(f"{result['phase']:<10} {result['engine'] or '-':<8} {result['size']:>12} "
+              f"{old['bytes_per_sec'] / 1e6:9.2f} -> {result['bytes_per_sec'] / 1e6:9.2f} MB/s  {ratio - 1:+7.1%}  "
+              f"peak {result['peak_bytes'] / old['peak_bytes'] - 1:+7.1%}")
+        if ratio < 1 - threshold:
+            regressions.append(result)
+    return regressions
+
+
+def report(results: list[dict]):
+    for result in results:
+        if "error" in result:
+            print(f"{result['phase']:<10} {result['engine'] or '-':<8} {result['size']:>12} error: {result['error']}")
+            continue
+        nodes = f" {result['nodes_per_sec'] / 1e3:9.1f} Knodes/s" if "nodes_per_sec" in result else ""
+        print(f"{result['phase']:<10} {result['engine'] or '-':<8} {result['size']:>12} "
+              f"{result['bytes_per_sec'] / 1e6:9.2f} MB/s {result['tokens_per_sec'] / 1e3:9.1f} Ktok/s{nodes} "
+              f"peak {result['peak_bytes'] / (1 << 20):8.1f} MiB")
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog="biskuit.bench", description="lexer and parser throughput on a generated corpus")
+    parser.add_argument("--sizes", nargs="+", default=["1K", "64K", "1M"], help="corpus sizes, e.g. 1K 16M")
+    parser.add_argument("--engine", choices=["scanner", "pattern", "all"], default="all")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--declarations-only", action="store_true", help="only imports and typed definitions, no values or function bodies")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against an earlier --output, exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed throughput loss for --compare")
+    parser.add_argument("--write-corpus", metavar="PATH", help="only write a corpus of the first size to PATH")
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(size) for size in args.sizes]
+    if args.write_corpus:
+        write_corpus(args.write_corpus, sizes[0], args.seed, args.declarations_only)
+        return 0
+
+    engines = list(LexEngine) if args.engine == "all" else [LexEngine[args.engine.capitalize()]]
+    current = {
+        "version": BENCH_VERSION,
+        "revision": revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": args.seed,
+        "declarations_only": args.declarations_only,
+        "results": run(sizes, engines, args.repeat, args.seed, args.declarations_only),
+    }
+    report(current["results"])
+    if args.output:
+        Path(args.output).write_text(json.dumps(current, indent=2))
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if compare(baseline, current, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
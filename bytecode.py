@@ -0,0 +1,537 @@
+from array import array
+from collections.abc import Generator
+from dataclasses import dataclass, field
+
+from .checker import Builtins
+from .constants import ConstantResult, Widths, fold_constants
+from .info import SourceRange
+from .nodes import Node, NodeType
+from .parse import Diagnostic, DiagnosticType
+
+
+class Op:
+    # an instruction is four unsigned ints "op a b c"; registers are indexes into the frame, the constants are
+    # registers too, after the others; jumps go to instruction indexes; binary operators come first, the VM
+    # runs them all through one table: a = Binary[op](b, c)
+    Add = 0
+    Subtract = 1
+    Multiply = 2
+    Divide = 3
+    Modulo = 4
+    BitAnd = 5
+    BitOr = 6
+    BitXOr = 7
+    ShiftLeft = 8
+    ShiftRight = 9
+    Equals = 10
+    NotEquals = 11
+    Less = 12
+    LessEquals = 13
+    Greater = 14
+    GreaterEquals = 15
+    RotateLeft = 16  # + 2 * index of the width in RotateWidths + signed
+    RotateRight = 24
+    Binary = 32  # the first opcode that is not a binary operator
+
+    Move = 32  # a = b
+    LoadGlobal = 33  # a = globals[b]
+    StoreGlobal = 34  # globals[a] = b
+    JumpIfFalse = 35  # to b unless a
+    JumpIfTrue = 36  # to b if a
+    Negate = 37  # a = -b
+    Not = 38  # a = not b
+    Invert = 39  # a = ~b
+    Wrap = 40  # a to b bits, two's complement if c
+    Call = 41  # a = b(b + 1, ..., b + c)
+    Return = 42  # the value of a
+    ReturnNone = 43
+    Fail = 44  # raises with the message in a, code that did not compile
+
+    Size = 4  # ints per instruction
+    Constants = 1 << 24  # + index, the register of a constant until the function is complete
+    RotateWidths = (8, 16, 32, 64)
+
+    Binaries = {
+        NodeType.BinOpAdd: Add,
+        NodeType.BinOpSubtract: Subtract,
+        NodeType.BinOpMultiply: Multiply,
+        NodeType.BinOpDivide: Divide,
+        NodeType.BinOpModulo: Modulo,
+        NodeType.BinOpBitAnd: BitAnd,
+        NodeType.BinOpBitOr: BitOr,
+        NodeType.BinOpBitXOr: BitXOr,
+        NodeType.BinOpBitShiftLeft: ShiftLeft,
+        NodeType.BinOpBitShiftRight: ShiftRight,
+        NodeType.BinOpCompareEquals: Equals,
+        NodeType.BinOpCompareNotEquals: NotEquals,
+        NodeType.BinOpCompareLess: Less,
+        NodeType.BinOpCompareLessEquals: LessEquals,
+        NodeType.BinOpCompareGreater: Greater,
+        NodeType.BinOpCompareGreaterEquals: GreaterEquals,
+        NodeType.BinOpBitRotateLeft: RotateLeft,
+        NodeType.BinOpBitRotateRight: RotateRight,
+    }
+    Logic = {NodeType.BinOpLogicAnd: JumpIfFalse, NodeType.BinOpLogicOr: JumpIfTrue}  # jump over the right side
+    Unary = {NodeType.UnaryOpNegate: Negate, NodeType.UnaryOpLogicNot: Not, NodeType.UnaryOpBitInvert: Invert}
+
+
+Natives = {  # host functions a program can call by name unless it defines the name itself
+    "print": print,
+}
+
+
+@dataclass(slots=True, eq=False)
+class Function():
+    name: str
+    parameters: int = 0  # they are the first registers
+    registers: int = 0
+    defaults: list = field(default_factory=list)  # values of the last parameters, used when a call leaves them out
+    code: array = field(default_factory=lambda: array("I"))
+    constants: list = field(default_factory=list)  # held by the registers after the first `registers` ones
+    offsets: array = field(default_factory=lambda: array("I"))  # source offset of each instruction, for errors
+    initial: list = None  # the registers after the parameters at the start of a call, constants included
+    instructions: list = field(default=None, repr=False)  # code as (op, a, b, c) tuples, decoded by the VM
+
+    def __repr__(self):
+        return f"Function({self.name}, {len(self.code) // Op.Size} instructions)"
+
+
+@dataclass(slots=True)
+class Program():
+    init: Function  # runs the values of the global definitions
+    globals: list  # initial values, functions are in place before init runs
+    slots: dict[str, int]  # global name -> index into globals
+    diagnostics: list[Diagnostic] = field(default_factory=list)
+
+
+class Emitter():
+    # the function being compiled; locals take registers in the order they are declared, the temporaries of an
+    # expression the ones above them, and all of them are free again after the statement
+    __slots__ = ("function", "scopes", "locals", "top", "width", "result", "indexes")
+
+    def __init__(self, function: Function, result: tuple[int, bool] | None):
+        self.function = function
+        self.scopes: list[dict[int, tuple[int, tuple]]] = [{}]  # symbol id -> register, (bits, signed) or None
+        self.locals = 0
+        self.top = 0
+        self.width = Widths.Bits[Widths.Default]  # for rotates, that of the declaration being computed
+        self.result = result  # integer width of the return type
+        self.indexes: dict[tuple, int] = {}  # (type, value) -> index into function.constants
+
+    def temp(self) -> int:
+        register = self.top
+        self.top += 1
+        if self.top > self.function.registers:
+            self.function.registers = self.top
+        return register
+
+    def declare(self, symbol: int, width: tuple[int, bool] | None, register: int):
+        self.scopes[-1][symbol] = register, width
+
+    def lookup(self, symbol: int):
+        for scope in reversed(self.scopes):
+            found = scope.get(symbol)
+            if found is not None:
+                return found
+        return None
+
+    def constant(self, value) -> int:
+        # the register holding value, never written to
+        key = (type(value), value)
+        index = self.indexes.get(key)
+        if index is None:
+            index = self.indexes[key] = len(self.function.constants)
+            self.function.constants.append(value)
+        return Op.Constants + index
+
+    def finish(self):
+        # constant registers follow the others, whose number is only known now
+        function = self.function
+        code, base = function.code, function.registers - Op.Constants
+        for idx, value in enumerate(code):
+            if value >= Op.Constants:
+                code[idx] = value + base
+        function.initial = [None] * (function.registers - function.parameters) + function.constants
+
+
+class Compiler():
+    # lowers the functions and global definitions of one module; constants come from fold_constants, aliases
+    # are never recomputed at run time
+    def __init__(self, constants: ConstantResult, natives: dict):
+        self.constants = constants
+        self.natives = natives
+        self.diagnostics: list[Diagnostic] = []
+        self.globals: dict[int, Node] = {}  # symbol id -> top-level Alias or Definition
+        self.slots: dict[Node, int] = {}  # declaration -> index into values
+        self.values: list = []
+        self.emitter: Emitter = None
+
+    def report(self, type: DiagnosticType, range: SourceRange):
+        self.diagnostics.append(Diagnostic(type, SourceRange(range.start, range.end)))
+
+    def emit(self, op: int, a: int = 0, b: int = 0, c: int = 0, node: Node = None) -> int:
+        function = self.emitter.function
+        function.code.extend((op, a, b, c))
+        function.offsets.append(node.range.start if node is not None else 0)
+        return len(function.code) - Op.Size
+
+    def patch(self, jump: int):
+        # the jump at offset jump goes to the next instruction emitted
+        code = self.emitter.function.code
+        code[jump + 2] = len(code) // Op.Size
+
+    def fail(self, type: DiagnosticType, node: Node, dest: int = None) -> int:
+        self.report(type, node.range)
+        self.emit(Op.Fail, self.emitter.constant(f"{type.name} ({node.type.__name__.lstrip('_')})"), node=node)
+        return self.emitter.temp() if dest is None else dest
+
+    # module
+
+    def program(self, ast: Node) -> Program:
+        slots = {}
+        for node in ast.data.globals:
+            if node.type is not NodeType.Alias and node.type is not NodeType.Definition or node.data.symbol is None:
+                continue
+            if node.data.symbol in self.globals:
+                continue  # a redefinition, the checker reports it
+            self.globals[node.data.symbol] = node
+            value = node.data.value
+            if node.type is NodeType.Definition or value is not None and value.type is NodeType.Function:
+                self.slots[node] = slots[node.data.name] = len(self.values)
+                self.values.append(self.initial(node))
+
+        for node, slot in self.slots.items():
+            if node.type is NodeType.Alias:
+                self.values[slot] = self.function(node.data.value, node.data.name)
+
+        init = Function("<module>")
+        self.emitter = Emitter(init, None)
+        code, offsets = init.code, init.offsets
+        for node, slot in self.slots.items():
+            if node.type is NodeType.Definition and node.data.value is not None:
+                start, reported = len(code), len(self.diagnostics)
+                width = self.integer(node.data.type)
+                if width is not None:
+                    self.emitter.width = width
+                register = self.expression(node.data.value)
+                if width is not None:
+                    if register >= Op.Constants:
+                        register = self.move(register, node)
+                    self.emit(Op.Wrap, register, *width, node=node)
+                self.emit(Op.StoreGlobal, slot, register, node=node)
+                if len(self.diagnostics) > reported:  # left at its initial value instead of failing every run
+                    del code[start:], offsets[start // Op.Size:]
+                self.emitter.top = self.emitter.locals
+                self.emitter.width = Widths.Bits[Widths.Default]
+        self.emit(Op.ReturnNone)
+        self.emitter.finish()
+        self.emitter = None
+        return Program(init, self.values, slots, self.diagnostics)
+
+    def initial(self, node: Node):
+        # what a declared but not yet assigned variable holds
+        return 0 if node.type is NodeType.Definition and self.integer(node.data.type) is not None else None
+
+    def integer(self, node: Node | None) -> tuple[int, bool] | None:
+        # (bits, signed) of an integer type node, through top-level aliases like "Byte :: u8;"
+        seen = set()
+        while node is not None and (node.type is NodeType.NamedType or node.type is NodeType.Name):
+            declaration = self.globals.get(node.data.symbol)
+            if declaration is None:
+                return Widths.Bits.get(Builtins.Named.get(node.data.name))
+            if declaration.type is not NodeType.Alias or declaration in seen:
+                return None
+            seen.add(declaration)
+            node = declaration.data.value
+        return None
+
+    # functions
+
+    def function(self, node: Node, name: str) -> Function:
+        header = node.data.header
+        function = Function(name)
+        outer = self.emitter
+        emitter = self.emitter = Emitter(function, self.integer(header.data.return_type))
+        for parameter in header.data.parameter:
+            if parameter.type is not NodeType.Parameter:
+                continue  # reported by the parser
+            register = emitter.temp()
+            width = self.integer(parameter.data.type)
+            emitter.declare(parameter.data.symbol, width, register)
+            default = parameter.data.default_value
+            if default is not None and default.type in (NodeType.Integer, NodeType.Float, NodeType.Boolean, NodeType.String):
+                function.defaults.append(default.data.value)
+            elif default is not None or function.defaults:
+                self.fail(DiagnosticType.NotExecutable, default if default is not None else parameter)
+                function.defaults.clear()
+        function.parameters = emitter.locals = emitter.top
+        for register, width in emitter.scopes[0].values():
+            if width is not None:
+                self.emit(Op.Wrap, register, *width, node=node)
+
+        self.block(node.data.block)
+        self.emit(Op.ReturnNone, node=node)
+        emitter.finish()
+        self.emitter = outer
+        return function
+
+    def block(self, node: Node):
+        # nested blocks over an explicit stack of (statements left, locals of the enclosing block)
+        emitter = self.emitter
+        stack = [(iter(node.data.statements), emitter.locals)]
+        emitter.scopes.append({})
+        while stack:
+            statements, locals = stack[-1]
+            statement = next(statements, None)
+            if statement is None:
+                stack.pop()
+                emitter.scopes.pop()
+                emitter.top = emitter.locals = locals
+            elif statement.type is NodeType.Block:
+                stack.append((iter(statement.data.statements), emitter.locals))
+                emitter.scopes.append({})
+            else:
+                self.statement(statement)
+
+    def statement(self, node: Node):
+        emitter = self.emitter
+        match node.type:
+            case NodeType.Definition | NodeType.Alias:
+                width = self.integer(node.data.type) if node.type is NodeType.Definition else None
+                register = emitter.temp()
+                emitter.locals = emitter.top
+                if width is not None:
+                    emitter.width = width
+                if node.data.value is not None:
+                    self.expression(node.data.value, register)
+                    if width is not None:
+                        self.emit(Op.Wrap, register, *width, node=node)
+                else:
+                    self.emit(Op.Move, register, emitter.constant(0 if width is not None else None), node=node)
+                emitter.declare(node.data.symbol, width, register)
+            case NodeType.Return:
+                if node.data.node is None:
+                    self.emit(Op.ReturnNone, node=node)
+                else:
+                    if emitter.result is not None:
+                        emitter.width = emitter.result
+                    register = self.expression(node.data.node)
+                    if emitter.result is not None:  # the function returns, changing a local in place is fine
+                        if register >= Op.Constants:
+                            register = self.move(register, node)
+                        self.emit(Op.Wrap, register, *emitter.result, node=node)
+                    self.emit(Op.Return, register, node=node)
+            case NodeType.Error:
+                pass
+            case _:
+                self.expression(node)
+        emitter.top = emitter.locals
+        emitter.width = Widths.Bits[Widths.Default]
+
+    # expressions
+
+    def expression(self, node: Node, dest: int = None) -> int:
+        # the register holding the value of node, dest if given; only the last instruction writes dest, so it
+        # may be a register the expression reads, "x = x + 1"; operators are lowered by generators that yield
+        # (operand, dest) and are sent its register back, run over an explicit stack so that right nested and
+        # parenthesised operands, "1 + (2 + (3 + ...))" or "-(-(-...))", do not recurse
+        stack: list[Generator] = []
+        value = None
+        while True:
+            if node is not None:
+                kind = node.type
+                if kind in Op.Binaries or kind in Op.Logic:
+                    stack.append(self.binary(node, dest))
+                elif kind is NodeType.Assignment:
+                    stack.append(self.assignment(node, dest))
+                elif kind is NodeType.UnaryOpPlus or kind in Op.Unary:
+                    stack.append(self.unary(node, dest))
+                else:
+                    value = self.operand(node, dest)
+                    if not stack:
+                        return value
+                node = None
+            try:
+                node, dest = stack[-1].send(value)
+                value = None
+            except StopIteration as stop:
+                stack.pop()
+                value = stop.value
+                if not stack:
+                    return value
+
+    def operand(self, node: Node, dest: int | None) -> int:
+        # the expressions that have no operators left to lower
+        match node.type:
+            case NodeType.Integer | NodeType.Float | NodeType.Boolean | NodeType.String:
+                return self.load(node.data.value, node, dest)
+            case NodeType.Name:
+                return self.name(node, dest)
+            case NodeType.Member:
+                value = self.member(node)
+                if value is None:
+                    return self.fail(DiagnosticType.NotExecutable, node, dest)
+                return self.load(value, node, dest)
+            case NodeType.Call:
+                return self.call(node, dest)
+            case NodeType.Function:
+                return self.load(self.function(node, "<function>"), node, dest)
+        return self.fail(DiagnosticType.NotExecutable, node, dest)
+
+    def unary(self, node: Node, dest: int | None) -> Generator:
+        if node.type is NodeType.UnaryOpPlus:
+            return (yield node.data.node, dest)
+        emitter = self.emitter
+        mark = emitter.top
+        operand = yield node.data.node, None
+        emitter.top = mark
+        dest = emitter.temp() if dest is None else dest
+        self.emit(Op.Unary[node.type], dest, operand, node=node)
+        return dest
+
+    def binary(self, node: Node, dest: int | None) -> Generator:
+        # left operand chains, "a + b + c + ...", are compiled in a loop into one temporary
+        emitter = self.emitter
+        spine = []
+        while node.type in Op.Binaries or node.type in Op.Logic:
+            spine.append(node)
+            node = node.data.left
+        mark = emitter.top
+        value = yield node, None
+        for node in reversed(spine):
+            kind = node.type
+            if kind in Op.Logic:
+                emitter.top = mark
+                target = emitter.temp()
+                if value != target:
+                    self.emit(Op.Move, target, value, node=node)
+                jump = self.emit(Op.Logic[kind], target, node=node)
+                yield node.data.right, target
+                self.patch(jump)
+                value = target
+                continue
+            right = yield node.data.right, None
+            emitter.top = mark
+            target = dest if dest is not None and node is spine[0] else emitter.temp()
+            op = Op.Binaries[kind]
+            if op == Op.RotateLeft or op == Op.RotateRight:
+                bits, signed = emitter.width
+                op += 2 * Op.RotateWidths.index(bits) + signed
+            self.emit(op, target, value, right, node)
+            value = target
+        if dest is not None and value != dest:
+            self.emit(Op.Move, dest, value, node=node)
+            value = dest
+        return value
+
+    def load(self, value, node: Node, dest: int | None) -> int:
+        register = self.emitter.constant(value)
+        return register if dest is None else self.move(register, node, dest)
+
+    def move(self, register: int, node: Node, dest: int = None) -> int:
+        dest = self.emitter.temp() if dest is None else dest
+        self.emit(Op.Move, dest, register, node=node)
+        return dest
+
+    def name(self, node: Node, dest: int | None) -> int:
+        local = self.emitter.lookup(node.data.symbol)
+        if local is not None:
+            register = local[0]
+            return register if dest is None or dest == register else self.move(register, node, dest)
+        declaration = self.globals.get(node.data.symbol)
+        if declaration is not None:
+            value = self.constants.values.get(declaration)
+            if declaration.type is NodeType.Alias and value is not None:
+                return self.load(value, node, dest)
+            slot = self.slots.get(declaration)
+            if slot is None:  # a type
+                return self.fail(DiagnosticType.NotExecutable, node, dest)
+            dest = self.emitter.temp() if dest is None else dest
+            self.emit(Op.LoadGlobal, dest, slot, node=node)
+            return dest
+        if node.data.name in self.natives:
+            return self.load(self.natives[node.data.name], node, dest)
+        return self.fail(DiagnosticType.UnknownName, node, dest)
+
+    def member(self, node: Node):
+        # "E.A" for a constant member of a top-level enum or struct, the only members there are at run time
+        if node.data.node.type is not NodeType.Name or self.emitter.lookup(node.data.node.data.symbol) is not None:
+            return None
+        declaration = self.globals.get(node.data.node.data.symbol)
+        shape = declaration.data.value if declaration is not None and declaration.type is NodeType.Alias else None
+        if shape is None or shape.type not in (NodeType.EnumType, NodeType.StructureType):
+            return None
+        for member in shape.data.member:
+            if member.type is NodeType.Alias and member.data.symbol == node.data.symbol:
+                return self.constants.values.get(member)
+        return None
+
+    def assignment(self, node: Node, dest: int | None) -> Generator:
+        # "a = b = c = 1" goes right to left in a loop, long chains do not recurse
+        emitter = self.emitter
+        chain = []  # (assignment, local register, width, global slot)
+        while True:
+            target = node.data.left
+            if target.type is not NodeType.Name:
+                return self.fail(DiagnosticType.NotExecutable, target, dest)
+            local = emitter.lookup(target.data.symbol)
+            if local is not None:
+                chain.append((node, *local, None))
+            else:
+                declaration = self.globals.get(target.data.symbol)
+                if declaration is None or declaration.type is not NodeType.Definition:
+                    return self.fail(DiagnosticType.NotExecutable if declaration else DiagnosticType.UnknownName, target, dest)
+                chain.append((node, None, self.integer(declaration.data.type), self.slots[declaration]))
+            if chain[-1][2] is not None:
+                emitter.width = chain[-1][2]
+            if node.data.right.type is not NodeType.Assignment:
+                break
+            node = node.data.right
+
+        value = None  # the register holding the value of the assignment compiled last
+        for idx in range(len(chain) - 1, -1, -1):
+            node, register, width, slot = chain[idx]
+            target = dest if idx == 0 else None
+            if register is not None:
+                if value is None:
+                    yield node.data.right, register
+                elif value != register:
+                    self.emit(Op.Move, register, value, node=node)
+                if width is not None:
+                    self.emit(Op.Wrap, register, *width, node=node)
+                value = register if target is None else self.move(register, node, target)
+                continue
+            if value is None:
+                register = yield node.data.right, target
+            else:
+                register = value if target is None or value == target else self.move(value, node, target)
+            if width is not None:
+                if register < emitter.locals or register >= Op.Constants:
+                    register = self.move(register, node)
+                self.emit(Op.Wrap, register, *width, node=node)
+            self.emit(Op.StoreGlobal, slot, register, node=node)
+            value = register
+        return value
+
+    def call(self, node: Node, dest: int | None) -> int:
+        # the callee and its arguments go to consecutive registers
+        emitter = self.emitter
+        mark = emitter.top
+        base = emitter.temp()
+        for _ in node.data.arguments:
+            emitter.temp()
+        self.expression(node.data.callee, base)
+        for idx, argument in enumerate(node.data.arguments):
+            self.expression(argument, base + 1 + idx)
+        emitter.top = mark
+        dest = emitter.temp() if dest is None else dest
+        self.emit(Op.Call, dest, base, len(node.data.arguments), node=node)
+        return dest
+
+
+def compile_program(ast: Node, constants: ConstantResult = None, natives: dict = None) -> Program:
+    # constants is the module's fold_constants result, folded here if not given; imports are not linked,
+    # their names are unknown at run time
+    if constants is None:
+        constants = fold_constants(ast)
+    return Compiler(constants, Natives if natives is None else natives).program(ast)
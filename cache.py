@@ -0,0 +1,145 @@
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from hashlib import sha256
+from pathlib import Path
+
+from .arena import AstArena
+from .info import SourceCode, SourceRange
+from .lexer import LexResult, TokenBuffer
+from .nodes import Node, NodeType, iter_tree
+from .parse import Diagnostic, DiagnosticType, ParseResult, Segment
+
+FRONTEND_VERSION = 7  # bump whenever tokens, nodes or diagnostics change shape
+MAGIC = b"BSKC"
+
+
+class FrontendCache():
+    # lex/parse results on disk, one file per source hash; an entry is plain data (see pack), the directory
+    # may be shared, loading one never runs code from it
+    def __init__(self, directory: str | Path, max_bytes: int = 512 << 20, max_age: float = 30 * 24 * 3600):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def key(self, code: SourceCode):
+        return source_digest(code, FRONTEND_VERSION)
+
+    def path(self, code: SourceCode):
+        return self.directory / f"{self.key(code)}.bkc"
+
+    def load(self, code: SourceCode) -> tuple[LexResult, ParseResult] | None:
+        path = self.path(code)
+        try:
+            with open(path, "rb") as f:
+                blob = f.read()
+        except FileNotFoundError:
+            return None
+        if blob[:4] != MAGIC:
+            return None
+        try:
+            table, columns = unpack(zlib.decompress(blob[4:]))
+            tokens = TokenBuffer(code)
+            tokens.kinds, tokens.tags, tokens.starts, tokens.ends = columns[:4]
+            arena = AstArena()
+            arena.kinds, arena.starts, arena.ends, arena.fields, arena.slots = columns[4:]
+            arena.values = [DiagnosticType[value["diagnostic"]] if type(value) is dict else value for value in table["values"]]
+            ast = arena.to_tree()
+            diagnostics = [Diagnostic(DiagnosticType[type], SourceRange(start, end)) for type, start, end in table["diagnostics"]]
+            globals = iter(ast.data.globals)
+            segments, position = [], 0
+            for token, has_node, count in table["segments"]:
+                segments.append(Segment(token, next(globals) if has_node else None, diagnostics[position : position + count]))
+                position += count
+        except Exception:  # truncated, tampered with or written by an incompatible version
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path)  # eviction is least recently used first
+        intern_tree(ast, code)
+        return LexResult(tokens), ParseResult(ast, diagnostics, segments, tokens)
+
+    def store(self, code: SourceCode, lex_result: LexResult, parse_result: ParseResult):
+        tokens = lex_result.tokens
+        arena = AstArena.from_tree(parse_result.ast)
+        payload = pack({
+            "values": [{"diagnostic": value.name} if type(value) is DiagnosticType else value for value in arena.values],
+            "diagnostics": [(d.type.name, d.range.start, d.range.end) for d in parse_result.diagnostics],
+            "segments": [(segment.token, segment.node is not None, len(segment.diagnostics)) for segment in parse_result.segments],
+        }, [tokens.kinds, tokens.tags, tokens.starts, tokens.ends, arena.kinds, arena.starts, arena.ends, arena.fields, arena.slots])
+        path = self.path(code)
+        temp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temp, "wb") as f:
+            f.write(MAGIC)
+            f.write(zlib.compress(payload, 1))
+        os.replace(temp, path)  # readers never see a half written entry
+
+    def evict(self):
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".bkc"):
+                continue
+            stat = entry.stat()
+            if now - stat.st_mtime > self.max_age:
+                os.unlink(entry.path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.unlink(path)
+            total -= size
+
+
+def pack(table: dict, columns: list[array]) -> bytes:
+    # a JSON table, then the raw bytes of the columns it lists
+    table["columns"] = [(column.typecode, column.itemsize, len(column)) for column in columns]
+    table["byteorder"] = sys.byteorder
+    head = json.dumps(table, separators=(",", ":")).encode("utf-8")
+    return b"".join((struct.pack("<I", len(head)), head, *(column.tobytes() for column in columns)))
+
+
+def unpack(body: bytes) -> tuple[dict, list[array]]:
+    # raises on anything that does not fit the layout pack writes
+    (size,) = struct.unpack_from("<I", body)
+    table = json.loads(body[4 : 4 + size])
+    if table["byteorder"] != sys.byteorder:
+        raise ValueError("written on a machine of the other byte order")
+    columns, offset = [], 4 + size
+    for typecode, itemsize, length in table["columns"]:
+        column = array(typecode)
+        if column.itemsize != itemsize:
+            raise ValueError(f"array {typecode!r} items are not {itemsize} bytes here")
+        column.frombytes(body[offset : offset + itemsize * length])
+        offset += itemsize * length
+        columns.append(column)
+    if offset != len(body):
+        raise ValueError("entry size does not match its columns")
+    return table, columns
+
+
+def source_digest(code: SourceCode, version: int) -> str:
+    digest = sha256(version.to_bytes(4, "little"))
+    digest.update(code.data if code.text is None else code.text.encode("utf-8"))  # ASCII data is its own UTF-8
+    return digest.hexdigest()
+
+
+def intern_tree(root: Node, code: SourceCode):
+    # symbol ids belong to the compilation that wrote the entry, renumber them in code.symbols
+    intern, names = code.symbols.intern, code.symbols.names
+    for node in iter_tree(root):
+        data = node.data
+        if getattr(data, "symbol", None) is None:
+            continue
+        if node.type is NodeType.String:
+            data.symbol = intern(code.fragment(node.range.start, node.range.end))
+        else:
+            data.symbol = intern(data.name)
+            data.name = names[data.symbol]
@@ -0,0 +1,494 @@
+from dataclasses import dataclass, field
+
+from .info import SourceRange
+from .nodes import Node, NodeType
+from .parse import Diagnostic, DiagnosticType
+from .walker import Visitor
+
+# types are compared with `is`: builtins are singletons, function types are interned by their parts and
+# every struct or enum declaration is its own type
+
+@dataclass(slots=True, eq=False)
+class BuiltinType():
+    name: str
+    integer: bool = False
+    floating: bool = False
+
+@dataclass(slots=True, eq=False)
+class FunctionType():
+    parameters: tuple
+    result: object
+
+@dataclass(slots=True, eq=False)
+class StructType():
+    name: str | None
+    node: Node
+    members: dict[int, object] = field(default_factory=dict)  # by symbol id
+
+@dataclass(slots=True, eq=False)
+class EnumType():
+    name: str | None
+    node: Node
+    base: object = None
+    members: dict[int, object] = field(default_factory=dict)
+
+
+class Operations:
+    Arithmetic = frozenset((NodeType.BinOpAdd, NodeType.BinOpSubtract, NodeType.BinOpMultiply, NodeType.BinOpDivide,
+                            NodeType.BinOpModulo))
+    Bitwise = frozenset((NodeType.BinOpBitAnd, NodeType.BinOpBitOr, NodeType.BinOpBitXOr))
+    Shift = frozenset((NodeType.BinOpBitShiftLeft, NodeType.BinOpBitRotateLeft, NodeType.BinOpBitShiftRight,
+                       NodeType.BinOpBitRotateRight))
+    Compare = frozenset((NodeType.BinOpCompareEquals, NodeType.BinOpCompareNotEquals, NodeType.BinOpCompareLess,
+                         NodeType.BinOpCompareLessEquals, NodeType.BinOpCompareGreater, NodeType.BinOpCompareGreaterEquals))
+    Logic = frozenset((NodeType.BinOpLogicAnd, NodeType.BinOpLogicOr))
+    Binary = Arithmetic | Bitwise | Shift | Compare | Logic | {NodeType.Assignment}
+    Numeric = frozenset((NodeType.UnaryOpPlus, NodeType.UnaryOpNegate))
+    Unary = Numeric | {NodeType.UnaryOpBitInvert, NodeType.UnaryOpLogicNot}
+    Prefix = Unary | {NodeType.UnaryOpPointer, NodeType.UnaryOpNullCheck, NodeType.UnaryOpFollow}
+
+
+class Builtins:
+    Unknown = BuiltinType("<unknown>")  # result of an error, fits everywhere so one mistake is reported once
+    Void = BuiltinType("void")
+    Bool = BuiltinType("bool")
+    String = BuiltinType("string")
+    IntegerLiteral = BuiltinType("<integer>", integer=True)
+    FloatLiteral = BuiltinType("<float>", floating=True)
+
+    Named = {
+        "void": Void,
+        "bool": Bool,
+        "string": String,
+        **{f"{sign}{bits}": BuiltinType(f"{sign}{bits}", integer=True) for sign in "iu" for bits in (8, 16, 32, 64)},
+        **{f"f{bits}": BuiltinType(f"f{bits}", floating=True) for bits in (32, 64)},
+    }
+
+
+def assignable(target, source):
+    if target is source or target is Builtins.Unknown or source is Builtins.Unknown:
+        return True
+    if source is Builtins.IntegerLiteral:
+        return getattr(target, "integer", False) or getattr(target, "floating", False)
+    if source is Builtins.FloatLiteral:
+        return getattr(target, "floating", False)
+    return False
+
+
+def common(left, right):
+    # the type both operands of a binary operator convert to, None if there is none
+    if assignable(left, right) and left is not Builtins.IntegerLiteral and left is not Builtins.FloatLiteral:
+        return left
+    if assignable(right, left) and right is not Builtins.IntegerLiteral and right is not Builtins.FloatLiteral:
+        return right
+    if left is Builtins.FloatLiteral and right is Builtins.IntegerLiteral or left is Builtins.IntegerLiteral and right is Builtins.FloatLiteral:
+        return Builtins.FloatLiteral
+    return left if left is right else None
+
+
+def numeric(type_) -> bool:
+    return getattr(type_, "integer", False) or getattr(type_, "floating", False)
+
+
+@dataclass(slots=True, eq=False)
+class Symbol():
+    name: str
+    node: Node  # Alias, Definition or Parameter
+    scope: "Scope"
+
+
+class Scope():
+    __slots__ = ("parent", "owner", "symbols")
+
+    def __init__(self, parent: "Scope" = None, owner=None):
+        self.parent = parent
+        self.owner = owner  # the StructType or EnumType whose members these are
+        self.symbols: dict[int, Symbol] = {}  # by symbol id, see info.Interner
+
+    def lookup(self, id: int) -> Symbol | None:
+        scope = self
+        while scope is not None:
+            symbol = scope.symbols.get(id)
+            if symbol is not None:
+                return symbol
+            scope = scope.parent
+        return None
+
+
+@dataclass(slots=True)
+class TypeCheckResult():
+    diagnostics: list[Diagnostic] = field(default_factory=list)
+    types: dict[Node, object] = field(default_factory=dict)  # type of every checked value, type and declaration
+    scope: Scope = None  # the module's globals
+
+
+class Checker(Visitor):
+    # declarations are resolved on first use and memoized, the walk only makes sure every one gets resolved;
+    # each declaration, type node and value is resolved once no matter how often it is referred to
+    def __init__(self, imports: list[TypeCheckResult] = None):
+        self.result = TypeCheckResult()
+        self.types = self.result.types
+        self.symbols: dict[Node, Symbol] = {}
+        self.resolved: dict[Node, tuple[bool, object]] = {}  # declaration -> (denotes a type, type)
+        self.active: set[Node] = set()  # declarations being resolved, to find alias cycles
+        self.functions: dict[tuple, FunctionType] = {}
+        self.parameters: dict[Node, Scope] = {}  # FunctionType -> scope of its parameters, the body's enclosing scope
+        self.scopes: list[Scope] = []  # innermost last while walking, see enter_Module and enter_Block
+        self.results: list = []  # result type of the functions being walked, innermost last
+        self.imports = imports
+        self.strict = True  # unknown names are only reported when every import could be looked into
+
+        parent = None
+        if imports:
+            parent = Scope()
+            for imported in imports:
+                for name, symbol in imported.scope.symbols.items():
+                    parent.symbols.setdefault(name, symbol)
+        self.module = Scope(parent)
+        self.result.scope = self.module
+
+    def report(self, type: DiagnosticType, range: SourceRange):
+        self.result.diagnostics.append(Diagnostic(type, SourceRange(range.start, range.end)))
+
+    def declare(self, scope: Scope, node: Node):
+        if node.type not in (NodeType.Alias, NodeType.Definition, NodeType.Parameter) or node.data.symbol is None:
+            return
+        symbol = Symbol(node.data.name, node, scope)
+        self.symbols[node] = symbol
+        if node.data.symbol in scope.symbols:
+            self.report(DiagnosticType.Redefinition, node.range)
+        else:
+            scope.symbols[node.data.symbol] = symbol
+
+    # walk
+
+    def enter_Module(self, node: Node):
+        for child in node.data.globals:
+            if child.type is NodeType.Import and self.imports is None:
+                self.strict = False
+            self.declare(self.module, child)
+        self.scopes.append(self.module)
+        for child in node.data.globals:
+            if child.type not in Statements:
+                self.value_type(child, self.module)
+
+    def enter_Function(self, node: Node):
+        function = self.resolve_type(node.data.header, self.scopes[-1])
+        self.scopes.append(self.parameters[node.data.header])
+        self.results.append(function.result if type(function) is FunctionType else Builtins.Unknown)
+
+    def leave_Function(self, node: Node):
+        self.scopes.pop()
+        self.results.pop()
+
+    def enter_Block(self, node: Node):
+        # definitions are visible in the whole block like globals in the module, statements are checked once
+        # all of them are declared; nested blocks and function bodies get theirs when the walk reaches them
+        scope = Scope(self.scopes[-1])
+        for statement in node.data.statements:
+            self.declare(scope, statement)
+        self.scopes.append(scope)
+        for statement in node.data.statements:
+            if statement.type not in Statements:
+                self.value_type(statement, scope)
+
+    def leave_Block(self, node: Node):
+        self.scopes.pop()
+
+    def enter_Return(self, node: Node):
+        value = node.data.node
+        value_type = self.value_type(value, self.scopes[-1]) if value is not None else Builtins.Void
+        if self.results and not assignable(self.results[-1], value_type):
+            self.report(DiagnosticType.TypeMismatch, (value or node).range)
+
+    def enter_Alias(self, node: Node):
+        self.declaration(node)
+
+    def enter_Definition(self, node: Node):
+        self.declaration(node)
+
+    def enter_Parameter(self, node: Node):
+        self.declaration(node)
+
+    # resolution
+
+    def declaration(self, node: Node) -> tuple[bool, object]:
+        # (denotes a type, the type) of an Alias, Definition or Parameter; chains like "A :: B;" or "a := b;"
+        # are followed in a loop so that long chains neither recurse nor get resolved more than once
+        if node in self.resolved:
+            return self.resolved[node]
+        symbol = self.symbols.get(node)
+        if symbol is None:
+            return False, Builtins.Unknown
+
+        chain = []
+        while True:
+            if node in self.resolved:
+                result = self.resolved[node]
+                break
+            if node in self.active:
+                self.report(DiagnosticType.AliasCycle, node.range)
+                result = False, Builtins.Unknown
+                if not chain:  # got back here through a value, e.g. "a := b; b := a;"
+                    return result
+                break
+            self.active.add(node)
+            chain.append(node)
+            value = chained_name(node)
+            if value is None:
+                result = self.resolve_declaration(node, symbol.scope)
+                break
+            target = symbol.scope.lookup(value.data.symbol)
+            if target is None:
+                result = self.unknown_name(value, Builtins.Named.get(value.data.name), DiagnosticType.UnknownName)
+                break
+            node, symbol = target.node, target
+
+        for node in reversed(chain):
+            self.active.discard(node)
+            if node.type is not NodeType.Alias and result[0]:
+                result = False, Builtins.Unknown  # "x := i32;" is not a value
+            self.resolved.setdefault(node, result)
+            self.types.setdefault(node, result[1])
+            value = chained_name(node)
+            if value is not None:
+                self.types[value] = result[1]
+        return self.resolved[chain[0]]
+
+    def resolve_declaration(self, node: Node, scope: Scope) -> tuple[bool, object]:
+        match node.type:
+            case NodeType.Alias:
+                value = node.data.value
+                match value.type:
+                    case NodeType.StructureType | NodeType.EnumType:
+                        type_ = self.new_compound(value, node.data.name)
+                        self.resolved[node] = True, type_  # members may refer back to it
+                        self.fill_compound(value, type_, scope)
+                        return True, type_
+                    case NodeType.FunctionType:
+                        return True, self.resolve_type(value, scope)
+                value_type = self.value_type(value, scope)
+                if scope.owner is not None and type(scope.owner) is EnumType:
+                    if not assignable(scope.owner.base, value_type):
+                        self.report(DiagnosticType.TypeMismatch, value.range)
+                    return False, scope.owner
+                return False, value_type
+
+            case NodeType.Definition | NodeType.Parameter:
+                value = node.data.value if node.type is NodeType.Definition else node.data.default_value
+                declared = self.resolve_type(node.data.type, scope) if node.data.type is not None else None
+                value_type = self.value_type(value, scope) if value is not None else None
+                if declared is None:
+                    return False, value_type or Builtins.Unknown
+                if value_type is not None and not assignable(declared, value_type):
+                    self.report(DiagnosticType.TypeMismatch, value.range)
+                return False, declared
+        return False, Builtins.Unknown
+
+    def new_compound(self, node: Node, name: str = None):
+        if node.type is NodeType.StructureType:
+            return StructType(name, node)
+        return EnumType(name, node)
+
+    def fill_compound(self, node: Node, type_, scope: Scope):
+        members = Scope(scope, type_)
+        if type(type_) is EnumType:
+            type_.base = self.resolve_type(node.data.type, scope) if node.data.type is not None else Builtins.Named["i32"]
+        for member in node.data.member:
+            self.declare(members, member)
+        for member in node.data.member:
+            if member in self.symbols:
+                type_.members[member.data.symbol] = self.declaration(member)[1]
+
+    def resolve_type(self, node: Node, scope: Scope):
+        if node in self.types:
+            return self.types[node]
+        match node.type:
+            case NodeType.NamedType:
+                symbol = scope.lookup(node.data.symbol)
+                if symbol is None:
+                    type_ = self.unknown_name(node, Builtins.Named.get(node.data.name), DiagnosticType.UnknownType)[1]
+                else:
+                    is_type, type_ = self.declaration(symbol.node)
+                    if not is_type:
+                        if type_ is not Builtins.Unknown:
+                            self.report(DiagnosticType.NotAType, node.range)
+                        type_ = Builtins.Unknown
+            case NodeType.FunctionType:
+                parameters = self.parameters[node] = Scope(scope)
+                for parameter in node.data.parameter:
+                    self.declare(parameters, parameter)
+                types = []
+                for parameter in node.data.parameter:
+                    if parameter.type is NodeType.Parameter:
+                        if parameter in self.symbols:
+                            types.append(self.declaration(parameter)[1])
+                        else:
+                            types.append(self.resolve_type(parameter.data.type, parameters))
+                            self.resolved[parameter] = False, types[-1]
+                    else:
+                        types.append(Builtins.Unknown)
+                result = self.resolve_type(node.data.return_type, scope) if node.data.return_type is not None else Builtins.Void
+                key = (*types, result)
+                type_ = self.functions.get(key)
+                if type_ is None:
+                    type_ = self.functions[key] = FunctionType(tuple(types), result)
+            case NodeType.StructureType | NodeType.EnumType:
+                type_ = self.new_compound(node)
+                self.types[node] = type_
+                self.fill_compound(node, type_, scope)
+            case _:
+                type_ = Builtins.Unknown
+        self.types[node] = type_
+        return type_
+
+    def value_type(self, node: Node, scope: Scope):
+        # operands before the operation over an explicit stack, long operator chains do not recurse
+        if node in self.types:
+            return self.types[node]
+        stack = [(node, False)]
+        while stack:
+            current, ready = stack.pop()
+            if current in self.types:
+                continue
+            if ready:
+                self.types[current] = self.operation_type(current, scope)
+                continue
+            stack.append((current, True))
+            stack.extend((operand, False) for operand in operands(current) if operand not in self.types)
+        return self.types[node]
+
+    def operation_type(self, node: Node, scope: Scope):
+        # type of node once the types of its operands are known
+        types = self.types
+        match node.type:
+            case NodeType.Integer:
+                return Builtins.IntegerLiteral
+            case NodeType.Float:
+                return Builtins.FloatLiteral
+            case NodeType.String:
+                return Builtins.String
+            case NodeType.Boolean:
+                return Builtins.Bool
+            case NodeType.Name:
+                symbol = scope.lookup(node.data.symbol)
+                if symbol is None:
+                    return self.unknown_name(node, None, DiagnosticType.UnknownName)[1]
+                is_type, type_ = self.declaration(symbol.node)
+                return Builtins.Unknown if is_type else type_
+            case NodeType.Function:
+                return self.resolve_type(node.data.header, scope)
+            case NodeType.Call:
+                return self.call_type(node)
+            case NodeType.Member if node.data.node is not None:
+                owner = types[node.data.node]
+                if type(owner) is StructType:
+                    return owner.members.get(node.data.symbol, Builtins.Unknown)
+                return Builtins.Unknown
+            case kind if kind in Operations.Binary:
+                return self.binary_type(node, types[node.data.left], types[node.data.right])
+            case kind if kind in Operations.Unary:
+                operand = types[node.data.node]
+                if operand is Builtins.Unknown or type(operand) is StructType:
+                    return Builtins.Unknown
+                if kind is NodeType.UnaryOpLogicNot:
+                    fits = operand is Builtins.Bool
+                elif kind is NodeType.UnaryOpBitInvert:
+                    fits = getattr(operand, "integer", False)
+                else:
+                    fits = numeric(operand)
+                if not fits:
+                    self.report(DiagnosticType.TypeMismatch, node.data.node.range)
+                    return Builtins.Unknown
+                return operand
+        return Builtins.Unknown
+
+    def binary_type(self, node: Node, left, right):
+        kind = node.type
+        if kind is NodeType.Assignment:
+            if not assignable(left, right):
+                self.report(DiagnosticType.TypeMismatch, node.data.right.range)
+            return left
+        if left is Builtins.Unknown or right is Builtins.Unknown:
+            return Builtins.Unknown
+        if type(left) is StructType or type(right) is StructType:
+            return Builtins.Unknown  # operators on structs are their own functions, "operator []= :: ..."
+        if kind in Operations.Shift:
+            fits, result = getattr(left, "integer", False) and getattr(right, "integer", False), left
+        else:
+            result = common(left, right)
+            if kind in Operations.Arithmetic:
+                fits = numeric(result)
+            elif kind in Operations.Bitwise:
+                fits = getattr(result, "integer", False)
+            elif kind in Operations.Logic:
+                fits = result is Builtins.Bool
+            else:
+                fits, result = result is not None, Builtins.Bool
+        if not fits:
+            self.report(DiagnosticType.TypeMismatch, node.range)
+            return Builtins.Unknown
+        return result
+
+    def call_type(self, node: Node):
+        callee = self.types[node.data.callee]
+        if callee is Builtins.Unknown or type(callee) is StructType:
+            return Builtins.Unknown
+        if type(callee) is not FunctionType:
+            self.report(DiagnosticType.TypeMismatch, node.data.callee.range)
+            return Builtins.Unknown
+        arguments = node.data.arguments
+        if len(arguments) > len(callee.parameters):  # fewer may be fine, parameters can have default values
+            self.report(DiagnosticType.TypeMismatch, node.range)
+        for argument, parameter in zip(arguments, callee.parameters):
+            if not assignable(parameter, self.types[argument]):
+                self.report(DiagnosticType.TypeMismatch, argument.range)
+        return callee.result
+
+    def unknown_name(self, node: Node, builtin, diagnostic: DiagnosticType) -> tuple[bool, object]:
+        if builtin is not None:
+            return True, builtin
+        if self.strict:
+            self.report(diagnostic, node.range)
+        return False, Builtins.Unknown
+
+
+Statements = frozenset((NodeType.Alias, NodeType.Definition, NodeType.Import, NodeType.Block, NodeType.Return, NodeType.Error))
+
+
+def operands(node: Node) -> tuple:
+    # the values an operation needs the types of
+    data = node.data
+    match node.type:
+        case NodeType.Call:
+            return (data.callee, *data.arguments)
+        case NodeType.Index:
+            return data.node, data.index
+        case NodeType.Member:
+            return (data.node,) if data.node is not None else ()
+        case kind if kind in Operations.Binary:
+            return data.left, data.right
+        case kind if kind in Operations.Prefix:
+            return data.node,
+    return ()
+
+
+def chained_name(node: Node) -> Node | None:
+    # the Name a declaration merely forwards to, "A :: B;" or "a := b;"
+    match node.type:
+        case NodeType.Alias:
+            value = node.data.value
+        case NodeType.Definition if node.data.type is None:
+            value = node.data.value
+        case _:
+            return None
+    return value if value is not None and value.type is NodeType.Name else None
+
+
+def check_type(ast: Node, imports: list[TypeCheckResult] = None) -> TypeCheckResult:
+    # imports are the results of the modules this one imports, parsed with the same SourceCode.symbols so the
+    # symbol ids agree; without them names that are not found
+    # are only reported for modules that import nothing
+    checker = Checker(imports)
+    checker.walk(ast)
+    return checker.result
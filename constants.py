@@ -0,0 +1,369 @@
+import math
+import operator
+import struct
+from dataclasses import dataclass, field
+
+from .checker import Builtins, BuiltinType, Scope, Symbol, chained_name
+from .info import SourceRange
+from .nodes import Node, NodeType
+from .parse import Diagnostic, DiagnosticType
+
+# compile-time values are Python ints, floats and bools; an int is kept in the range of the integer type it is
+# evaluated at, wrapping around in two's complement the way the machine would
+
+
+class Widths:
+    Default = Builtins.Named["i64"]  # of untyped constants, "A :: 1 << 40;"
+    Enum = Builtins.Named["i32"]  # base of an enum declared without one, as in the checker
+    F32 = Builtins.Named["f32"]
+    Bits = {type: (int(name[1:]), name[0] == "i") for name, type in Builtins.Named.items() if type.integer}
+
+
+class Operators:
+    Arithmetic = {  # on ints, or on floats once either side is one
+        NodeType.BinOpAdd: operator.add,
+        NodeType.BinOpSubtract: operator.sub,
+        NodeType.BinOpMultiply: operator.mul,
+    }
+    Bitwise = {
+        NodeType.BinOpBitAnd: operator.and_,
+        NodeType.BinOpBitOr: operator.or_,
+        NodeType.BinOpBitXOr: operator.xor,
+    }
+    Compare = {
+        NodeType.BinOpCompareEquals: operator.eq,
+        NodeType.BinOpCompareNotEquals: operator.ne,
+        NodeType.BinOpCompareLess: operator.lt,
+        NodeType.BinOpCompareLessEquals: operator.le,
+        NodeType.BinOpCompareGreater: operator.gt,
+        NodeType.BinOpCompareGreaterEquals: operator.ge,
+    }
+    Division = (NodeType.BinOpDivide, NodeType.BinOpModulo)
+    Shift = (NodeType.BinOpBitShiftLeft, NodeType.BinOpBitShiftRight)
+    Rotate = (NodeType.BinOpBitRotateLeft, NodeType.BinOpBitRotateRight)
+    Logic = (NodeType.BinOpLogicAnd, NodeType.BinOpLogicOr)
+    Binary = frozenset((*Arithmetic, *Bitwise, *Compare, *Division, *Shift, *Rotate, *Logic))
+    Unary = frozenset((NodeType.UnaryOpPlus, NodeType.UnaryOpNegate, NodeType.UnaryOpLogicNot, NodeType.UnaryOpBitInvert))
+    Folded = Binary | Unary  # replaced by a literal once their value is known
+
+    Literals = {bool: NodeType.Boolean, int: NodeType.Integer, float: NodeType.Float}
+
+
+@dataclass(slots=True)
+class ConstantResult():
+    diagnostics: list[Diagnostic] = field(default_factory=list)
+    values: dict[Node, object] = field(default_factory=dict)  # Alias or Definition -> its value, None if not constant
+    scope: Scope = None  # the module's globals
+
+
+class ConstantEvaluator():
+    # aliases are evaluated on first use and memoized, so a constant is computed once however many others
+    # refer to it; both the declarations a value depends on and its operator chains are handled on explicit
+    # stacks, deep chains never recurse
+    def __init__(self, imports: list[ConstantResult] = None):
+        self.result = ConstantResult()
+        self.values = self.result.values
+        self.symbols: dict[Node, Symbol] = {}
+        self.widths: dict[Node, BuiltinType] = {}  # declaration -> type its value is evaluated at, if not untyped
+        self.targets: dict[Node, Node] = {}  # Name or Member -> the Alias it refers to
+        self.active: set[Node] = set()  # declarations waiting for their dependencies, to find cycles
+
+        parent = None
+        if imports:
+            parent = Scope()
+            for imported in imports:
+                for name, symbol in imported.scope.symbols.items():
+                    parent.symbols.setdefault(name, symbol)
+                self.values.update(imported.values)  # evaluated with their own module, never again
+        self.module = Scope(parent)
+        self.result.scope = self.module
+
+    def report(self, type: DiagnosticType, range: SourceRange):
+        self.result.diagnostics.append(Diagnostic(type, SourceRange(range.start, range.end)))
+
+    def run(self, ast: Node):
+        declarations = []
+        pending = [(self.module, ast.data.globals, None)]
+        while pending:
+            scope, members, base = pending.pop()
+            for node in members:
+                self.declare(scope, node, base)
+            for node in members:
+                if node.type is not NodeType.Alias and node.type is not NodeType.Definition:
+                    continue
+                declarations.append(node)
+                shapes = (node.data.value, node.data.type) if node.type is NodeType.Definition else (node.data.value,)
+                for shape in shapes:
+                    if shape is None:
+                        continue
+                    if shape.type is NodeType.EnumType:
+                        base = self.builtin(shape.data.type, scope) if shape.data.type is not None else Widths.Enum
+                        pending.append((Scope(scope), shape.data.member, base))
+                    elif shape.type is NodeType.StructureType:
+                        pending.append((Scope(scope), shape.data.member, None))
+        for node in declarations:
+            self.constant(node)
+
+    def declare(self, scope: Scope, node: Node, base: BuiltinType):
+        # base is the enum's, None for structs and globals
+        if node.type not in (NodeType.Alias, NodeType.Definition) or node.data.symbol is None:
+            return
+        symbol = Symbol(node.data.name, node, scope)
+        self.symbols[node] = symbol
+        scope.symbols.setdefault(node.data.symbol, symbol)  # the checker reports redefinitions
+        if node.type is NodeType.Alias and base is not None:
+            self.widths[node] = base
+        elif node.type is NodeType.Definition and node.data.type is not None:
+            width = self.builtin(node.data.type, scope)
+            if width is not None:
+                self.widths[node] = width
+
+    def builtin(self, node: Node, scope: Scope) -> BuiltinType | None:
+        # the integer or float type a type node names, through aliases like "Byte :: u8;"
+        seen = set()
+        while node.type is NodeType.NamedType or node.type is NodeType.Name:
+            symbol = scope.lookup(node.data.symbol)
+            if symbol is None:
+                type_ = Builtins.Named.get(node.data.name)
+                return type_ if type_ is not None and (type_.integer or type_.floating) else None
+            if symbol.node.type is not NodeType.Alias or symbol.node in seen:
+                return None
+            seen.add(symbol.node)
+            node, scope = symbol.node.data.value, symbol.scope
+        return None
+
+    # declarations
+
+    def constant(self, declaration: Node):
+        # the value of an Alias or Definition, None if it is not a compile-time constant
+        if declaration in self.values:
+            return self.values[declaration]
+        stack = [declaration]
+        path = []  # active declarations, each waiting for the ones after it
+        while stack:
+            node = stack[-1]
+            if node in self.values:
+                stack.pop()
+                continue
+            if path and path[-1] is node:  # dependencies done
+                self.values[node] = self.evaluate(node)
+                self.active.discard(path.pop())
+                stack.pop()
+                continue
+            path.append(node)
+            self.active.add(node)
+            for target in self.dependencies(node):
+                if target not in self.active:
+                    stack.append(target)
+                    continue
+                cycle = path[path.index(target):]
+                if any(chained_name(member) is None for member in cycle):  # plain "A :: B;" cycles are the checker's
+                    self.report(DiagnosticType.AliasCycle, node.range)
+        return self.values[declaration]
+
+    def dependencies(self, node: Node) -> list[Node]:
+        # the aliases the operators of node's value refer to that are not evaluated yet
+        scope = self.symbols[node].scope
+        found = []
+        stack = [node.data.value] if node.data.value is not None else []
+        while stack:
+            node = stack.pop()
+            if node.type in Operators.Binary:
+                stack.append(node.data.left)
+                stack.append(node.data.right)
+            elif node.type in Operators.Unary:
+                stack.append(node.data.node)
+            elif node.type is NodeType.Name or node.type is NodeType.Member:
+                target = self.target(node, scope)
+                if target is not None and target not in self.values and target in self.symbols:
+                    found.append(target)
+        return found
+
+    def target(self, node: Node, scope: Scope) -> Node | None:
+        # the Alias a Name refers to, or the member alias of "E.A" for an enum or struct E
+        if node in self.targets:
+            return self.targets[node]
+        target = None
+        name = node if node.type is NodeType.Name else node.data.node
+        symbol = scope.lookup(name.data.symbol) if name.type is NodeType.Name else None
+        if symbol is not None and symbol.node.type is NodeType.Alias:
+            target = symbol.node
+            if node.type is NodeType.Member:
+                shape = target.data.value
+                target = None
+                if shape is not None and shape.type in (NodeType.EnumType, NodeType.StructureType):
+                    for member in shape.data.member:
+                        if member.type is NodeType.Alias and member.data.symbol == node.data.symbol:
+                            target = member
+                            break
+        self.targets[node] = target
+        return target
+
+    def evaluate(self, node: Node):
+        value = node.data.value
+        if value is None:
+            return None
+        width = self.widths.get(node)
+        result = self.fold(value, self.symbols[node].scope, width)
+        if result is None or type(result) is bool:
+            pass
+        elif width is not None and width.floating:
+            result = self.to_float(float(result), width, value)
+        elif type(result) is float and width is not None:
+            result = None  # "x : i32 = 0.5;", a type mismatch
+        if result is not None and value.type in Operators.Folded:
+            node.data.value = literal(result, value.range)
+        return result
+
+    # values
+
+    def fold(self, root: Node, scope: Scope, width: BuiltinType | None):
+        # post order; operators with a constant value are replaced by literals where their parent is not constant
+        bits, signed = Widths.Bits.get(width) or Widths.Bits[Widths.Default]
+        values = []  # of the operands evaluated so far
+        stack = [(root, False)]
+        while stack:
+            node, ready = stack.pop()
+            kind = node.type
+            if kind in Operators.Binary:
+                if not ready:
+                    stack.append((node, True))
+                    stack.append((node.data.right, False))
+                    stack.append((node.data.left, False))
+                    continue
+                right = values.pop()
+                left = values.pop()
+                value = self.binary(node, left, right, bits, signed)
+                if value is None:
+                    if left is not None and node.data.left.type in Operators.Folded:
+                        node.data.left = literal(left, node.data.left.range)
+                    if right is not None and node.data.right.type in Operators.Folded:
+                        node.data.right = literal(right, node.data.right.range)
+            elif kind in Operators.Unary:
+                if kind is NodeType.UnaryOpNegate and node.data.node.type is NodeType.Integer:
+                    # "-128" for i8: the literal is only out of range before it is negated
+                    value = -node.data.node.data.value
+                    wrapped = wrap(value, bits, signed)
+                    if wrapped != value:
+                        self.report(DiagnosticType.ConstantOverflow, node.range)
+                    values.append(wrapped)
+                    continue
+                if not ready:
+                    stack.append((node, True))
+                    stack.append((node.data.node, False))
+                    continue
+                operand = values.pop()
+                value = self.unary(node, operand, bits, signed)
+                if value is None and operand is not None and node.data.node.type in Operators.Folded:
+                    node.data.node = literal(operand, node.data.node.range)
+            else:
+                value = self.operand(node, scope, bits, signed)
+            values.append(value)
+        return values[0]
+
+    def operand(self, node: Node, scope: Scope, bits: int, signed: bool):
+        match node.type:
+            case NodeType.Integer:
+                value = node.data.value
+            case NodeType.Float | NodeType.Boolean:
+                return node.data.value
+            case NodeType.Name | NodeType.Member:
+                target = self.target(node, scope)
+                value = self.values.get(target) if target is not None else None
+            case _:
+                return None
+        if type(value) is int:
+            wrapped = wrap(value, bits, signed)
+            if wrapped != value:
+                self.report(DiagnosticType.ConstantOverflow, node.range)
+            return wrapped
+        return value
+
+    def binary(self, node: Node, left, right, bits: int, signed: bool):
+        kind = node.type
+        if kind in Operators.Logic:
+            if kind is NodeType.BinOpLogicAnd and left is False or kind is NodeType.BinOpLogicOr and left is True:
+                return left
+            if type(left) is bool and type(right) is bool:
+                return right
+            return None
+        if left is None or right is None:
+            return None
+        integers = type(left) is int and type(right) is int
+        numbers = integers or (type(left) in (int, float) and type(right) in (int, float))
+        if kind in Operators.Compare:
+            return Operators.Compare[kind](left, right) if numbers or type(left) is type(right) else None
+        if not numbers:
+            return None
+        if kind in Operators.Arithmetic:
+            value = Operators.Arithmetic[kind](left, right)
+            return wrap(value, bits, signed) if integers else value
+        if kind in Operators.Division:
+            if right == 0:
+                self.report(DiagnosticType.DivisionByZero, node.data.right.range)
+                return None
+            if not integers:
+                return left / right if kind is NodeType.BinOpDivide else math.fmod(left, right)
+            quotient = abs(left) // abs(right)  # truncated towards zero, the remainder takes the sign of left
+            if (left < 0) != (right < 0):
+                quotient = -quotient
+            return wrap(quotient if kind is NodeType.BinOpDivide else left - right * quotient, bits, signed)
+        if not integers:
+            return None
+        if kind in Operators.Bitwise:
+            return wrap(Operators.Bitwise[kind](left, right), bits, signed)
+        if kind in Operators.Shift:
+            if not 0 <= right < bits:
+                self.report(DiagnosticType.ShiftOutOfRange, node.data.right.range)
+                return None
+            # left is in range already, so ">>" is arithmetic for signed types and logical for unsigned ones
+            return wrap(left << right, bits, signed) if kind is NodeType.BinOpBitShiftLeft else left >> right
+        # rotates go by the count modulo the width
+        count = right % bits if kind is NodeType.BinOpBitRotateLeft else -right % bits
+        mask = (1 << bits) - 1
+        pattern = left & mask
+        return wrap((pattern << count | pattern >> (bits - count)) & mask, bits, signed)
+
+    def unary(self, node: Node, operand, bits: int, signed: bool):
+        match node.type:
+            case NodeType.UnaryOpLogicNot if type(operand) is bool:
+                return not operand
+            case NodeType.UnaryOpPlus if type(operand) in (int, float):
+                return operand
+            case NodeType.UnaryOpNegate if type(operand) is int:
+                return wrap(-operand, bits, signed)
+            case NodeType.UnaryOpNegate if type(operand) is float:
+                return -operand
+            case NodeType.UnaryOpBitInvert if type(operand) is int:
+                return wrap(~operand, bits, signed)
+        return None
+
+    def to_float(self, value: float, width: BuiltinType, node: Node):
+        if width is not Widths.F32:
+            return value
+        try:
+            return struct.unpack("f", struct.pack("f", value))[0]
+        except OverflowError:
+            self.report(DiagnosticType.ConstantOverflow, node.range)
+            return None
+
+
+def wrap(value: int, bits: int, signed: bool) -> int:
+    value &= (1 << bits) - 1
+    if signed and value >> (bits - 1):
+        value -= 1 << bits
+    return value
+
+
+def literal(value, range: SourceRange) -> Node:
+    node = Node(Operators.Literals[type(value)], SourceRange(range.start, range.end))
+    node.data.value = value
+    return node
+
+
+def fold_constants(ast: Node, imports: list[ConstantResult] = None) -> ConstantResult:
+    # evaluates the aliases and the values of the definitions of a module, folding their constant operators into
+    # literals in place; imports are the results of the modules this one imports, see check_type
+    evaluator = ConstantEvaluator(imports)
+    evaluator.run(ast)
+    return evaluator.result
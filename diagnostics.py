@@ -0,0 +1,91 @@
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from enum import Enum, auto
+
+from .info import SourceRange
+from .tokens import TokenTag
+
+
+class DiagnosticType(Enum):
+    MissingSemicolon = auto()
+    GlobalNotAllowed = auto()
+    ImportExpectedString = auto()
+    DefinitionExpectedColon = auto()
+    TypeNotAllowed = auto()
+    ParameterExpectedName = auto()
+    ImportNotFound = auto()
+    ImportCycle = auto()
+    ValueNotAllowed = auto()
+    MemberNotAllowed = auto()
+    MembersExpectedOpenBrace = auto()
+    MembersExpectedCloseBrace = auto()
+    FunctionTypeExpectedCloseParenthesis = auto()
+    BlockExpectedOpenBrace = auto()
+    BlockExpectedCloseBrace = auto()
+    ValueExpectedCloseParenthesis = auto()
+    CallExpectedCloseParenthesis = auto()
+    IndexExpectedCloseBracket = auto()
+    UnknownType = auto()
+    UnknownName = auto()
+    NotAType = auto()
+    AliasCycle = auto()
+    TypeMismatch = auto()
+    Redefinition = auto()
+    UnexpectedCharacter = auto()
+    IncompleteNumber = auto()
+    IncompleteString = auto()
+    IncompleteDocComment = auto()
+    UnknownCompilerAction = auto()
+    IncompleteNotInitialized = auto()
+    DivisionByZero = auto()
+    ShiftOutOfRange = auto()
+    ConstantOverflow = auto()
+    NotExecutable = auto()
+
+@dataclass
+class Diagnostic():
+    type: DiagnosticType
+    range: SourceRange
+
+
+class LexDiagnostics:
+    # what an Undefined token is reported as, by its tag
+    Tag = {
+        None: DiagnosticType.UnexpectedCharacter,
+        TokenTag.IncompleteFormatNumber: DiagnosticType.IncompleteNumber,
+        TokenTag.IncompleteFloatNumber: DiagnosticType.IncompleteNumber,
+        TokenTag.IncompleteString: DiagnosticType.IncompleteString,
+        TokenTag.IncompleteDocComment: DiagnosticType.IncompleteDocComment,
+        TokenTag.IncompleteCompilerAction: DiagnosticType.UnknownCompilerAction,
+        TokenTag.IncompleteNotInitialized: DiagnosticType.IncompleteNotInitialized,
+    }
+
+
+class DiagnosticSink():
+    # diagnostics of the lexer and the parser as they are found; callback (e.g. queue.put) sees each one,
+    # and once budget of them are in, the producers stop early instead of finishing the file
+    __slots__ = ("diagnostics", "callback", "budget")
+
+    def __init__(self, callback: Callable[[Diagnostic], None] = None, budget: int = None):
+        self.diagnostics: list[Diagnostic] = []
+        self.callback = callback
+        self.budget = budget
+
+    def report(self, diagnostic: Diagnostic):
+        self.diagnostics.append(diagnostic)
+        if self.callback is not None:
+            self.callback(diagnostic)
+
+    def extend(self, diagnostics: Iterable[Diagnostic]):
+        # up to the budget, for diagnostics found without the sink (cached or checker ones)
+        for diagnostic in diagnostics:
+            if self.exhausted:
+                break
+            self.report(diagnostic)
+
+    @property
+    def exhausted(self):
+        return self.budget is not None and len(self.diagnostics) >= self.budget
+
+    def __len__(self):
+        return len(self.diagnostics)
@@ -0,0 +1,217 @@
+import json
+import os
+import zlib
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from enum import Enum, auto
+from pathlib import Path
+
+from .cache import source_digest
+from .info import SourceCode, SourceLocation, SourceRange
+from .lexer import tokenize
+from .nodes import Node, NodeType
+from .parse import build_ast
+
+INDEX_VERSION = 2  # bump whenever what is indexed per file changes
+MAGIC = b"BSKI"
+
+
+class DefinitionKind(Enum):
+    Constant = auto()
+    Variable = auto()
+    Function = auto()
+    Structure = auto()
+    Enumeration = auto()
+
+
+@dataclass(slots=True)
+class Symbol():
+    name: str
+    path: str
+    kind: DefinitionKind
+    range: SourceRange
+    location: tuple[SourceLocation, SourceLocation]  # range resolved at indexing time, lookups never read the file
+    doc: str = ""
+
+
+@dataclass(slots=True)
+class IndexedFile():
+    digest: str  # of the content the symbols were taken from
+    stamp: tuple[int, int]  # st_mtime_ns and st_size when digest was taken, None for unsaved documents
+    symbols: list[Symbol]
+
+
+class SymbolIndex():
+    # the top-level definitions of a workspace by name, kept on disk in one file if path is given
+    def __init__(self, path: str | Path = None):
+        self.path = Path(path) if path else None
+        self.files: dict[str, IndexedFile] = {}
+        self.names: list[str] = None  # sorted, built on the first lookup and kept sorted by store
+        self.symbols: list[Symbol] = None  # in the order of names
+        self.changed = False  # since load or save
+        if self.path:
+            self.load()
+
+    # lookups
+
+    def exact(self, name: str) -> list[Symbol]:
+        names, symbols = self.sorted()
+        return symbols[bisect_left(names, name) : bisect_right(names, name)]
+
+    def prefix(self, prefix: str, limit: int = None) -> list[Symbol]:
+        names, symbols = self.sorted()
+        idx = bisect_left(names, prefix)
+        stop = len(names) if limit is None else min(len(names), idx + limit)
+        found = []
+        while idx < stop and names[idx].startswith(prefix):
+            found.append(symbols[idx])
+            idx += 1
+        return found
+
+    def sorted(self):
+        if self.names is None:
+            self.symbols = sorted((symbol for file in self.files.values() for symbol in file.symbols), key=lambda s: s.name)
+            self.names = [symbol.name for symbol in self.symbols]
+        return self.names, self.symbols
+
+    def __len__(self):
+        return sum(len(file.symbols) for file in self.files.values())
+
+    # updates
+
+    def refresh(self, paths: list[str]) -> int:
+        # brings the index in line with exactly these files, returns how many were (re)indexed or dropped
+        count = sum(self.update(path) for path in paths)
+        for path in self.files.keys() - set(paths):
+            count += self.remove(path)
+        return count
+
+    def update(self, path: str) -> bool:
+        # reindexes path if its content changed; the content is only hashed if size or mtime differ
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return self.remove(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        known = self.files.get(path)
+        if known is not None and known.stamp == stamp:
+            return False
+        code = SourceCode.map(path)
+        digest = source_digest(code, INDEX_VERSION)
+        if known is not None and known.digest == digest:
+            known.stamp = stamp
+            self.changed = True
+            return False
+        self.store(path, IndexedFile(digest, stamp, definitions(path, code)))
+        return True
+
+    def update_code(self, path: str, code: SourceCode, ast: Node = None) -> bool:
+        # same for content not saved to path (an open editor buffer), ast is its settled parse if there is one
+        digest = source_digest(code, INDEX_VERSION)
+        known = self.files.get(path)
+        if known is not None and known.digest == digest:
+            return False
+        self.store(path, IndexedFile(digest, None, definitions(path, code, ast)))
+        return True
+
+    def remove(self, path: str) -> bool:
+        if path not in self.files:
+            return False
+        self.store(path, None)
+        return True
+
+    def store(self, path: str, file: IndexedFile | None):
+        # replaces the symbols of path, in the sorted lists as well: an edit costs a bisect per symbol
+        # of the one file instead of sorting the workspace again
+        old = self.files.pop(path, None) if file is None else self.files.get(path)
+        if file is not None:
+            self.files[path] = file
+        self.changed = True
+        if self.names is None:
+            return
+        names, symbols = self.names, self.symbols
+        for symbol in old.symbols if old is not None else ():
+            idx = bisect_left(names, symbol.name)
+            while symbols[idx] is not symbol:
+                idx += 1
+            del names[idx], symbols[idx]
+        for symbol in file.symbols if file is not None else ():
+            idx = bisect_right(names, symbol.name)
+            names.insert(idx, symbol.name)
+            symbols.insert(idx, symbol)
+
+    # persistence
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                blob = f.read()
+        except FileNotFoundError:
+            return
+        if blob[:4] != MAGIC:
+            return
+        try:
+            version, files = json.loads(zlib.decompress(blob[4:]))
+            if version != INDEX_VERSION:
+                return
+            kinds = tuple(DefinitionKind)
+            loaded = {}
+            for path, (digest, stamp, rows) in files.items():
+                symbols = [
+                    Symbol(name, path, kinds[kind], SourceRange(start, end),
+                           (SourceLocation(line, column), SourceLocation(end_line, end_column)), doc)
+                    for name, kind, start, end, line, column, end_line, end_column, doc in rows
+                ]
+                loaded[path] = IndexedFile(digest, tuple(stamp) if stamp is not None else None, symbols)
+        except Exception:  # truncated or tampered with, rebuilt on the next refresh
+            return
+        self.files = loaded
+        self.names = self.symbols = None
+        self.changed = False
+
+    def save(self):
+        # flat rows of plain JSON, the index file may be shared and loading it must not run anything from it
+        if self.path is None or not self.changed:
+            return
+        files = {
+            path: (file.digest, file.stamp, [(
+                symbol.name, symbol.kind.value - 1, symbol.range.start, symbol.range.end,
+                symbol.location[0].line, symbol.location[0].column, symbol.location[1].line, symbol.location[1].column,
+                symbol.doc,
+            ) for symbol in file.symbols])
+            for path, file in self.files.items()
+        }
+        payload = json.dumps((INDEX_VERSION, files), separators=(",", ":")).encode("utf-8")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temp, "wb") as f:
+            f.write(MAGIC)
+            f.write(zlib.compress(payload, 1))
+        os.replace(temp, self.path)  # readers never see a half written index
+        self.changed = False
+
+
+def definitions(path: str, code: SourceCode, ast: Node = None) -> list[Symbol]:
+    # the top-level aliases and definitions of code; without an ast it is parsed in outline mode, bodies are not needed
+    if ast is None:
+        ast = build_ast(tokenize(code), outline=True).ast
+    symbols = []
+    for node in ast.data.globals:
+        if node.type is NodeType.Alias or node.type is NodeType.Definition:
+            symbols.append(Symbol(node.data.name, path, definition_kind(node),
+                                  SourceRange(node.range.start, node.range.end), code.resolve(node.range), node.data.doc or ""))
+    return symbols
+
+
+def definition_kind(node: Node) -> DefinitionKind:
+    shape = node.data.value
+    if shape is None and node.type is NodeType.Definition:
+        shape = node.data.type
+    match shape.type if shape is not None else None:
+        case NodeType.Function:
+            return DefinitionKind.Function
+        case NodeType.StructureType:
+            return DefinitionKind.Structure
+        case NodeType.EnumType:
+            return DefinitionKind.Enumeration
+    return DefinitionKind.Constant if node.type is NodeType.Alias else DefinitionKind.Variable
@@ -1,41 +1,110 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import mmap
+import os
+import re
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass, field
+
+
+class Interner():
+    # dense ids for identifier and string lexemes, one table per compilation so equal ids mean equal names
+    __slots__ = ("ids", "names")
+
+    def __init__(self):
+        self.ids: dict[str, int] = {}
+        self.names: list[str] = []  # the one copy of every name, by id
+
+    def intern(self, name: str) -> int:
+        id = self.ids.get(name)
+        if id is None:
+            id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return id
+
+    def __getitem__(self, id: int) -> str:
+        return self.names[id]
+
+    def __contains__(self, name: str):
+        return name in self.ids
+
+    def __len__(self):
+        return len(self.names)
+
+
+NotAscii = re.compile(rb"[\x80-\xff\r]")  # "\r" too, text mode reads would turn "\r\n" into "\n"
+MapThreshold = 1 << 20  # smaller files are read, a map keeps a file descriptor open as long as its SourceCode lives
 
 
 @dataclass(slots=True)
 class SourceCode():
     name: str
-    text: str
+    text: str  # None if the source is data
+    symbols: Interner = field(default_factory=Interner, repr=False, compare=False)  # share it between the modules of one compilation
+    line_starts: array = field(default=None, init=False, repr=False, compare=False)
+    data: bytes | mmap.mmap = field(default=None, repr=False, compare=False)  # ASCII only, byte offsets are text offsets
+
+    @classmethod
+    def map(cls, path: str, symbols: Interner = None):
+        # maps a large file instead of reading it; text is only decoded per lexeme, unless the file is not plain ASCII
+        symbols = symbols if symbols is not None else Interner()
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < MapThreshold:
+                data = f.read()
+            else:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if not data:
+            return cls(path, "", symbols)
+        if NotAscii.search(data) is None:
+            return cls(path, None, symbols, data)
+        if isinstance(data, mmap.mmap):
+            data.close()
+        with open(path, "rt", encoding="utf-8") as f:
+            return cls(path, f.read(), symbols)
+
+    def fragment(self, start: int, end: int) -> str:
+        if self.text is None:
+            return self.data[start:end].decode("ascii")
+        return self.text[start:end]
+
+    def location(self, offset: int) -> SourceLocation:
+        if self.line_starts is None:
+            self.line_starts = array("I", [0])
+            if self.text is None:
+                self.line_starts.extend(m.end() for m in re.finditer(b"\n", self.data))
+            else:
+                self.line_starts.extend(m.end() for m in re.finditer("\n", self.text))
+        line = bisect_right(self.line_starts, offset) - 1
+        return SourceLocation(line, offset - self.line_starts[line])
+
+    def resolve(self, range: SourceRange) -> tuple[SourceLocation, SourceLocation]:
+        return self.location(range.start), self.location(range.end)
 
     def __getitem__(self, index):
+        if self.text is None:
+            return self.data[index].decode("ascii") if isinstance(index, slice) else chr(self.data[index])
         return self.text[index]
 
     def __len__(self):
-        return len(self.text)
+        return len(self.data if self.text is None else self.text)
 
 
 @dataclass(slots=True)
 class SourceLocation():
+    # resolved line/column of an offset, only built for display via SourceCode.location
     line: int
     column: int
 
-    def __lt__(self, other: SourceLocation):
-        if self.line < other.line:
-            return True
-        if self.line == other.line and self.column < other.column:
-            return True
-        return False
-
 
 @dataclass(slots=True)
 class SourceRange():
-    start: SourceLocation
-    end: SourceLocation
+    start: int  # offsets into SourceCode.text
+    end: int
 
     def expand(self, range: SourceRange):
-        assert self.start is min(self.start, range.start)
-        self.end = max(self.end, range.end)
+        if range.end > self.end:
+            self.end = range.end
         return self
 
     def to_shrink_to_end(self):
@@ -46,4 +115,4 @@ class SourceRange():
 
     @classmethod
     def zero(cls):
-        return cls(SourceLocation(0,0), SourceLocation(0,0))
\ No newline at end of file
+        return cls(0, 0)
\ No newline at end of file
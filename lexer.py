@@ -1,14 +1,26 @@
+from __future__ import annotations
 
+import os
+import re
+from array import array
+from bisect import bisect_left
 from dataclasses import dataclass
-from collections import defaultdict
+from collections import Counter, deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum, auto
 
-from .info import SourceCode, SourceLocation
+from .diagnostics import Diagnostic, DiagnosticSink, LexDiagnostics
+from .info import SourceCode, SourceRange
 from .tokens import Token, TokenType, TokenTag
 
 
+RawToken = tuple[TokenType, int, int, TokenTag]  # type, start offset, end offset, tag
+
+
 @dataclass(slots=True)
 class LexResult():
-    tokens: list[Token]
+    tokens: TokenBuffer
 
 
 class CharSets:
@@ -24,6 +36,9 @@ class CharSets:
     StringEnd = set(('"',)) | Newline
 
 
+Ascii = tuple(map(chr, range(128)))  # by byte value, see scan_scanner
+
+
 class LexemeMaps:
     Keyword = {
         "if": TokenType.If,
@@ -58,37 +73,398 @@ class LexemeMaps:
         "?": TokenType.Question,
         "@": TokenType.Follow,
     }
-
-
-def tokenize(code: SourceCode):
-    tokens = []
-
-    idx: int = 0
-    current: str = code[idx : idx+1]
-    line: int = 0
-    column: int = 0
-    location: SourceLocation
-
-    counter: defaultdict[TokenType, int] = defaultdict(int)
+    Operator = {
+        "/": TokenType.Divide,
+        "/=": TokenType.AssignDivide,
+        "-": TokenType.Minus,
+        "-=": TokenType.AssignSubtract,
+        "->": TokenType.ReturnArrow,
+        "---": TokenType.NotInitialized,
+        "+": TokenType.Plus,
+        "+=": TokenType.AssignAdd,
+        "*": TokenType.Asterisk,
+        "*=": TokenType.AssignMultiply,
+        "%": TokenType.Modulo,
+        "%=": TokenType.AssignModulo,
+        "&": TokenType.BitAnd,
+        "&=": TokenType.AssignBitAnd,
+        "&&": TokenType.LogicAnd,
+        "&&=": TokenType.AssignLogicAnd,
+        "|": TokenType.BitOr,
+        "|=": TokenType.AssignBitOr,
+        "||": TokenType.LogicOr,
+        "||=": TokenType.AssignLogicOr,
+        "^": TokenType.BitXOr,
+        "^=": TokenType.AssignBitXOr,
+        "!": TokenType.LogicNot,
+        "!=": TokenType.CompareNotEquals,
+        "=": TokenType.Assign,
+        "==": TokenType.CompareEquals,
+        "<": TokenType.CompareLess,
+        "<=": TokenType.CompareLessEquals,
+        "<<": TokenType.BitShiftLeft,
+        "<<=": TokenType.AssignBitShiftLeft,
+        "<<<": TokenType.BitRotateLeft,
+        "<<<=": TokenType.AssignBitRotateLeft,
+        ">": TokenType.CompareGreater,
+        ">=": TokenType.CompareGreaterEquals,
+        ">>": TokenType.BitShiftRight,
+        ">>=": TokenType.AssignBitShiftRight,
+        ">>>": TokenType.BitRotateRight,
+        ">>>=": TokenType.AssignBitRotateRight,
+    }
+    Fixed = Literal | Operator
+
+
+class TokenBuffer():
+    # one row per token in array columns, a Token is only materialized when asked for;
+    # after a relex the offsets from row shift_from on are still shift short, read them through
+    # start, end and find (or raw) or call settle() before using the columns directly
+    __slots__ = ("code", "kinds", "tags", "starts", "ends", "shift_from", "shift")
+
+    Types = (None, *TokenType)  # auto() values count up from 1, so value is the index
+    Tags = (None, *TokenTag)
+
+    def __init__(self, code: SourceCode):
+        self.code = code
+        self.kinds = array("B")
+        self.tags = array("B")  # 0 is no tag
+        self.starts = array("I")
+        self.ends = array("I")
+        self.shift_from = 0
+        self.shift = 0
+
+    def extend(self, raw: Iterable[RawToken]):
+        kinds, tags, starts, ends = self.kinds.append, self.tags.append, self.starts.append, self.ends.append
+        for tt, start, end, tag in raw:
+            kinds(tt.value)
+            tags(tag.value if tag else 0)
+            starts(start)
+            ends(end)
+
+    def raw(self, start: int = 0, stop: int = None) -> Iterator[RawToken]:
+        # memoryview slices, so reading from the middle of the buffer copies nothing
+        types, tags = self.Types, self.Tags
+        stop = len(self) if stop is None else stop
+        split = min(max(self.shift_from, start), stop) if self.shift else stop
+        rows = zip(*(memoryview(column)[start:split] for column in (self.kinds, self.starts, self.ends, self.tags)))
+        for kind, begin, end, tag in rows:
+            yield (types[kind], begin, end, tags[tag])
+        if split < stop:
+            shift = self.shift
+            rows = zip(*(memoryview(column)[split:stop] for column in (self.kinds, self.starts, self.ends, self.tags)))
+            for kind, begin, end, tag in rows:
+                yield (types[kind], begin + shift, end + shift, tags[tag])
+
+    def start(self, idx: int) -> int:
+        return self.starts[idx] + self.shift if self.shift and idx >= self.shift_from else self.starts[idx]
+
+    def end(self, idx: int) -> int:
+        return self.ends[idx] + self.shift if self.shift and idx >= self.shift_from else self.ends[idx]
+
+    def find(self, column: array, offset: int, lo: int = 0) -> int:
+        # bisect_left of offset in starts or ends, as if they were settled
+        split = self.shift_from if self.shift else len(self)
+        if lo < split:
+            idx = bisect_left(column, offset, lo, split)
+            if idx < split:
+                return idx
+            lo = split
+        return bisect_left(column, offset - self.shift, lo)
+
+    def settle(self):
+        # applies the pending shift, a pass over the rows after the last edit
+        if self.shift:
+            shift, idx = self.shift.__add__, self.shift_from
+            self.starts[idx:] = array("I", map(shift, self.starts[idx:]))
+            self.ends[idx:] = array("I", map(shift, self.ends[idx:]))
+            self.shift = 0
+
+    def type(self, idx: int) -> TokenType:
+        return self.Types[self.kinds[idx]]
+
+    def lexeme(self, idx: int) -> str:
+        tt = self.Types[self.kinds[idx]]
+        lexeme = Lexemes.get(tt) or self.code.fragment(self.start(idx), self.end(idx))
+        if tt in Interned:
+            return self.code.symbols.names[self.code.symbols.intern(lexeme)]
+        return lexeme
+
+    def symbol(self, idx: int) -> int | None:
+        if self.Types[self.kinds[idx]] not in Interned:
+            return None
+        return self.code.symbols.intern(self.code.fragment(self.start(idx), self.end(idx)))
+
+    def counts(self) -> Counter[TokenType]:
+        # straight from the kinds column, the lexers themselves count nothing
+        return Counter({self.Types[kind]: count for kind, count in Counter(self.kinds).items()})
+
+    @property
+    def nbytes(self):
+        return sum(column.itemsize * len(column) for column in (self.kinds, self.tags, self.starts, self.ends))
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, idx: int | slice) -> Token | list[Token]:
+        if isinstance(idx, slice):
+            start, stop, _ = idx.indices(len(self))
+            return list(materialize(self.code, self.raw(start, stop)))
+        if idx < 0:
+            idx += len(self)
+        return next(materialize(self.code, self.raw(idx, idx + 1)))
+
+    def __iter__(self) -> Iterator[Token]:
+        return materialize(self.code, self.raw())
+
+    def __repr__(self):
+        return f"TokenBuffer(code={self.code.name!r}, tokens={len(self)})"
+
+
+Lexemes = {  # token types that always have the same lexeme, never sliced from the source
+    tt: lexeme
+    for lexeme, tt in (LexemeMaps.Fixed | LexemeMaps.Keyword | LexemeMaps.Compiler).items()
+    if tt not in (TokenType.LogicAnd, TokenType.LogicOr, TokenType.LogicNot)
+}
+
+
+Interned = (TokenType.Identifier, TokenType.String)  # lexemes that get an id in SourceCode.symbols
+
+
+def materialize(code: SourceCode, raw: Iterable[RawToken]) -> Iterator[Token]:
+    # identifiers and strings share one lexeme object per name and carry its symbol id;
+    # a mapped source is only decoded here, per lexeme
+    text, fragment = code.text, code.fragment
+    intern, names = code.symbols.intern, code.symbols.names
+    for tt, start, end, tag in raw:
+        lexeme = Lexemes.get(tt)
+        if lexeme is not None:
+            yield Token(tt, lexeme, start, tag)
+        elif tt in Interned:
+            symbol = intern(text[start:end] if text is not None else fragment(start, end))
+            yield Token(tt, names[symbol], start, tag, symbol)
+        else:
+            yield Token(tt, text[start:end] if text is not None else fragment(start, end), start, tag)
+
+
+class LexEngine(Enum):
+    Scanner = auto()  # character by character
+    Pattern = auto()  # one precompiled master pattern, whole tokens per step
+
+
+def tokenize(code: SourceCode, engine: LexEngine = LexEngine.Scanner, sink: DiagnosticSink = None):
+    tokens = TokenBuffer(code)
+    tokens.extend(scan(code, engine) if sink is None else report(scan(code, engine), sink))
+    return LexResult(tokens)
+
+
+def tokenize_parallel(code: SourceCode, engine: LexEngine = LexEngine.Scanner, jobs: int = None,
+                      chunk_size: int = 1 << 20, sink: DiagnosticSink = None):
+    # same tokens as tokenize, the text is cut at split_points and the chunks are lexed on a process pool;
+    # the workers cannot report as they go, so sink gets the diagnostics afterwards and the budget stops nothing
+    jobs = jobs or os.cpu_count() or 1
+    text = code.text if code.text is not None else code.data
+    points = split_points(text, max(chunk_size, len(text) // (jobs * 4) + 1))
+    if jobs == 1 or not points:
+        return tokenize(code, engine, sink)
+
+    bounds = [0, *points, len(text)]
+    chunks = [text[begin:end] for begin, end in zip(bounds, bounds[1:])]
+    last = [False] * (len(chunks) - 1) + [True]
+    with ProcessPoolExecutor(min(jobs, len(chunks))) as pool:
+        columns = list(pool.map(lex_chunk, chunks, bounds, last, [engine] * len(chunks)))
+
+    tokens = TokenBuffer(code)
+    for kinds, tags, starts, ends in columns:
+        tokens.kinds += kinds
+        tokens.tags += tags
+        tokens.starts += starts
+        tokens.ends += ends
+    if sink is not None:
+        report_tokens(tokens, sink)
+    return LexResult(tokens)
+
+
+def split_points(text: str | bytes, chunk_size: int) -> list[int]:
+    # offsets about chunk_size apart at which lexing can restart: a newline right after a non-space
+    # character always begins a Newline token, as strings and line comments stop before it. Only doc
+    # comments span lines, so their extent is found first, skipping "/*" inside strings and line comments
+    newline, spaces, spans = ("\n", " \r\t\n", Patterns.Spans) if isinstance(text, str) else (b"\n", b" \r\t\n", Patterns.SpansBytes)
+    comments = [m.span() for m in spans.finditer(text) if m.lastgroup == "DocComment"]
+    points = []
+    target = chunk_size
+    idx = 0
+    while target < len(text):
+        pos = text.find(newline, target)
+        while pos > 0 and text[pos - 1 : pos] in spaces:
+            pos = text.find(newline, pos + 1)
+        if pos < 0:
+            break
+        while idx < len(comments) and comments[idx][1] <= pos:
+            idx += 1
+        if idx < len(comments) and comments[idx][0] < pos:
+            target = comments[idx][1]  # inside a doc comment, try again behind it
+            continue
+        points.append(pos)
+        target = pos + chunk_size
+    return points
+
+
+def lex_chunk(chunk: str | bytes, offset: int, last: bool, engine: LexEngine):
+    # runs in a worker: the columns of one chunk, shifted to offsets of the whole text
+    code = SourceCode("<chunk>", chunk) if isinstance(chunk, str) else SourceCode("<chunk>", None, data=chunk)
+    tokens = tokenize(code, engine).tokens
+    stop = len(tokens) if last else len(tokens) - 1  # only the last chunk ends the file
+    shift = offset.__add__
+    return (
+        tokens.kinds[:stop],
+        tokens.tags[:stop],
+        array("I", map(shift, tokens.starts[:stop])),
+        array("I", map(shift, tokens.ends[:stop])),
+    )
+
+
+def iter_tokens(code: SourceCode, engine: LexEngine = LexEngine.Scanner, sink: DiagnosticSink = None) -> Iterator[Token]:
+    return materialize(code, scan(code, engine) if sink is None else report(scan(code, engine), sink))
+
+
+def report(raw: Iterable[RawToken], sink: DiagnosticSink) -> Iterator[RawToken]:
+    # passes the tokens on, reporting the Undefined ones; once the budget is spent the file ends right there
+    for token in raw:
+        tt, start, end, tag = token
+        if tt is TokenType.Undefined:
+            sink.report(Diagnostic(LexDiagnostics.Tag[tag], SourceRange(start, end)))
+            if sink.exhausted:
+                yield (TokenType.EndOfFile, start, start, None)
+                return
+        yield token
+
+
+def report_tokens(tokens: TokenBuffer, sink: DiagnosticSink):
+    # the Undefined tokens of a finished lex (a cached one, say), found in the kinds column
+    kinds = bytes(tokens.kinds)
+    idx = kinds.find(TokenType.Undefined.value)
+    while idx >= 0 and not sink.exhausted:
+        sink.report(Diagnostic(LexDiagnostics.Tag[tokens.Tags[tokens.tags[idx]]], SourceRange(tokens.start(idx), tokens.end(idx))))
+        idx = kinds.find(TokenType.Undefined.value, idx + 1)
+
+
+def scan(code: SourceCode, engine: LexEngine = LexEngine.Scanner, start: int = 0) -> Iterator[RawToken]:
+    # start has to be a token boundary of a previous lex, the lexer carries no other state between tokens
+    match engine:
+        case LexEngine.Pattern:
+            return scan_pattern(code, start)
+        case _:
+            return scan_scanner(code, start)
+
+
+def relex(previous: LexResult, start: int, end: int, replacement: str, engine: LexEngine = LexEngine.Scanner):
+    # replace text[start:end] and lex only from the first token touching the edit
+    # until the new tokens line up with the old ones again
+    old = previous.tokens
+    old_text = old.code.fragment(0, len(old.code))
+    code = SourceCode(old.code.name, old_text[:start] + replacement + old_text[end:], old.code.symbols)
+    delta = len(replacement) - (end - start)
+    edit_end = start + len(replacement)
+
+    # tokens ending before the edit stop on a character that did not change, so they are final,
+    # and between tokens there is only skipped space, so the edit start itself is a safe restart too
+    first = old.find(old.ends, start)
+    restart = min(old.start(first), start)
+
+    kinds, tags, starts, ends = array("B"), array("B"), array("I"), array("I")
+    resume = len(old)
+    search = first
+    for tt, begin, stop, tag in scan(code, engine, restart):
+        if begin >= edit_end:
+            # same token at the same (shifted) place: everything after it is unchanged as well
+            search = old.find(old.starts, begin - delta, search)
+            idx = search
+            while idx < len(old) and old.start(idx) == begin - delta:
+                if old.kinds[idx] == tt.value and old.end(idx) == stop - delta and old.tags[idx] == (tag.value if tag else 0):
+                    resume = idx
+                    break
+                idx += 1
+            if resume < len(old):
+                break
+        kinds.append(tt.value)
+        tags.append(tag.value if tag else 0)
+        starts.append(begin)
+        ends.append(stop)
+
+    # the rows after the edit keep their old offsets and carry the shift instead of being rewritten; only the rows
+    # between this edit and the previous one are moved, so typing in one place costs nothing per token after it
+    tokens = TokenBuffer(code)
+    tokens.kinds = old.kinds[:first] + kinds + old.kinds[resume:]
+    tokens.tags = old.tags[:first] + tags + old.tags[resume:]
+    pending = old.shift_from if old.shift else resume
+    head, tail = slice(0, min(pending, first)), slice(min(pending, first), first)
+    tokens.starts = old.starts[head] + shifted(old.starts[tail], old.shift) + starts
+    tokens.ends = old.ends[head] + shifted(old.ends[tail], old.shift) + ends
+    tokens.shift_from = len(tokens.starts) + max(pending - resume, 0)
+    near, far = slice(resume, max(pending, resume)), slice(max(pending, resume), len(old))
+    tokens.starts += shifted(old.starts[near], delta) + old.starts[far]
+    tokens.ends += shifted(old.ends[near], delta) + old.ends[far]
+    tokens.shift = old.shift + delta
+    return LexResult(tokens)
+
+
+def shifted(column: array, delta: int) -> array:
+    return array("I", map(delta.__add__, column)) if delta else column
+
+
+class TokenStream():
+    # pulls tokens on demand, keeping only the lookahead window alive
+    __slots__ = ("source", "lookahead")
+
+    def __init__(self, source: Iterable[Token]):
+        self.source = iter(source)
+        self.lookahead: deque[Token] = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Token:
+        if self.lookahead:
+            return self.lookahead.popleft()
+        return next(self.source)
+
+    def peek(self, offset: int = 0) -> Token | None:
+        while len(self.lookahead) <= offset:
+            token = next(self.source, None)
+            if token is None:
+                return None
+            self.lookahead.append(token)
+        return self.lookahead[offset]
+
+
+def scan_scanner(code: SourceCode, start: int = 0) -> Iterator[RawToken]:
+    pending: list[RawToken] = []
+
+    text, data, size = code.text, code.data, len(code)
+    if text is None:
+        def read(idx: int):
+            # ASCII data, byte values index the shared one-character strings, nothing is decoded
+            return Ascii[data[idx]] if idx < size else ""
+    else:
+        def read(idx: int):
+            return text[idx : idx+1]
+
+    idx: int = start
+    current: str = read(idx)
+    location: int
 
     def make_location():
         nonlocal location
-        location = SourceLocation(line, column)
+        location = idx
 
-    def make_token(tt: TokenType, lexeme: list[str] | str, tag: TokenTag = None):
-        if isinstance(lexeme, list):
-            lexeme = "".join(lexeme)
-        tokens.append(Token(tt, lexeme, location, tag))
-        counter[tt] += 1
+    def make_token(tt: TokenType, tag: TokenTag = None):
+        pending.append((tt, location, idx, tag))
 
     def advance():
-        nonlocal idx, current, line, column
+        nonlocal idx, current
         idx += 1
-        column += 1
-        if current == "\n":
-            line += 1
-            column = 0
-        current = code[idx : idx+1]
+        current = read(idx)
 
     def consume():
         c = current
@@ -120,37 +496,39 @@ def tokenize(code: SourceCode):
         return into
 
     while True:
+        if pending:
+            yield from pending
+            pending.clear()
         make_location()
         match current:
 
             case "":
-                make_token(TokenType.EndOfFile, current)
+                make_token(TokenType.EndOfFile)
                 break
 
             case c if c in CharSets.Space:
                 advance()
 
             case c if c in CharSets.Newline:
-                lexeme = "".join(collect_all(CharSets.Space | CharSets.Newline))
-                lexeme.rstrip("".join(CharSets.Space))  # remove trailing spaces until \n
-                make_token(TokenType.Newline, lexeme)
+                collect_all(CharSets.Space | CharSets.Newline)
+                make_token(TokenType.Newline)
 
             case c if c in CharSets.IdentifierStart:
                 lexeme = "".join(collect_all(CharSets.Identifier))
                 tt = LexemeMaps.Keyword.get(lexeme, TokenType.Identifier)
-                make_token(tt, lexeme)
+                make_token(tt)
 
             case c if c in CharSets.Number:
                 number = collect_number(CharSets.Number)
 
                 if number == ["0",] and current in CharSets.NumberFormat:
-                    charset, tag = CharSets.BinNumber, TokenTag.BinFormat if current == "b" else CharSets.HexNumber, TokenTag.HexFormat
+                    charset, tag = (CharSets.BinNumber, TokenTag.BinFormat) if current == "b" else (CharSets.HexNumber, TokenTag.HexFormat)
                     number.append(consume())
                     collect_number(charset, number)
                     if len(number) <= 2:  # only "0x" or "0b"
-                        make_token(TokenType.Undefined, number, TokenTag.IncompleteFormatNumber)
+                        make_token(TokenType.Undefined, TokenTag.IncompleteFormatNumber)
                     else:
-                        make_token(TokenType.Integer, number, tag)
+                        make_token(TokenType.Integer, tag)
                     continue
 
                 if current == ".":
@@ -158,11 +536,11 @@ def tokenize(code: SourceCode):
                     float_part = collect_number(CharSets.Number)
                     number.extend(float_part)
                     if float_part:
-                        make_token(TokenType.Float, number)
+                        make_token(TokenType.Float)
                     else:
-                        make_token(TokenType.Undefined, number, TokenTag.IncompleteFloatNumber)
+                        make_token(TokenType.Undefined, TokenTag.IncompleteFloatNumber)
                 else:
-                    make_token(TokenType.Integer, number)
+                    make_token(TokenType.Integer)
 
             case "#":
                 lexeme = [consume(),]
@@ -171,19 +549,19 @@ def tokenize(code: SourceCode):
                 tag = None
                 if tt is TokenType.Undefined:
                     tag = TokenTag.IncompleteCompilerAction
-                make_token(tt, lexeme, tag)
+                make_token(tt, tag)
 
             case '"':
                 lexeme = [consume(),]
                 collect_until(CharSets.StringEnd, False, lexeme)
                 if current == '"':
                     lexeme.append(consume())
-                    make_token(TokenType.String, lexeme)
+                    make_token(TokenType.String)
                 else:
-                    make_token(TokenType.Undefined, lexeme, TokenTag.IncompleteString)
+                    make_token(TokenType.Undefined, TokenTag.IncompleteString)
                     if lexeme[-1] == ";":
                         make_location()
-                        make_token(TokenType.Semicolon, ";")
+                        make_token(TokenType.Semicolon)
 
             case "/":
                 # / // /* /=
@@ -193,122 +571,125 @@ def tokenize(code: SourceCode):
                         # //
                         lexeme = ["/", consume(),]
                         collect_until(CharSets.Newline, False, lexeme)
-                        make_token(TokenType.LineComment, lexeme)
+                        make_token(TokenType.LineComment)
                     case "*":
                         # /*
                         lexeme = ["/", consume(),]
                         while True:
                             collect_until(CharSets.DocCommentEnd, True, lexeme)
+                            if not current:
+                                make_token(TokenType.Undefined, TokenTag.IncompleteDocComment)
+                                break
                             if current == "/":
                                 lexeme.append(consume())
-                                make_token(TokenType.DocComment, lexeme)
+                                make_token(TokenType.DocComment)
                                 break
                     case "=":
                         # /=
                         advance()
-                        make_token(TokenType.AssignDivide, "/=")
+                        make_token(TokenType.AssignDivide)
                     case _:
                         # /
-                        make_token(TokenType.Divide, "/")
+                        make_token(TokenType.Divide)
 
             case "-":
                 advance()
                 match current:
                     case "=":
                         advance()
-                        make_token(TokenType.AssignSubtract, "-=")
+                        make_token(TokenType.AssignSubtract)
                     case ">":
                         advance()
-                        make_token(TokenType.ReturnArrow, "->")
+                        make_token(TokenType.ReturnArrow)
                     case "-":
                         advance()
                         if current == "-":
                             advance()
-                            make_token(TokenType.NotInitialized, "---")
+                            make_token(TokenType.NotInitialized)
                         else:
-                            make_token(TokenType.Undefined, "--", TokenTag.IncompleteNotInitialized)
+                            make_token(TokenType.Undefined, TokenTag.IncompleteNotInitialized)
                     case _:
-                        make_token(TokenType.Minus, "-")
+                        make_token(TokenType.Minus)
 
             case "+":
                 advance()
                 if current == "=":
                     advance()
-                    make_token(TokenType.AssignAdd, "+=")
+                    make_token(TokenType.AssignAdd)
                 else:
-                    make_token(TokenType.Plus, "+")
+                    make_token(TokenType.Plus)
 
             case "*":
                 advance()
                 if current == "=":
                     advance()
-                    make_token(TokenType.AssignMultiply, "*=")
+                    make_token(TokenType.AssignMultiply)
                 else:
-                    make_token(TokenType.Asterisk, "*")
+                    make_token(TokenType.Asterisk)
 
             case "%":
                 advance()
                 if current == "=":
                     advance()
-                    make_token(TokenType.AssignModulo, "%=")
+                    make_token(TokenType.AssignModulo)
                 else:
-                    make_token(TokenType.Modulo, "%")
+                    make_token(TokenType.Modulo)
 
             case "&":
                 advance()
                 match current:
                     case "=":
                         advance()
-                        make_token(TokenType.AssignBitAnd, "&=")
+                        make_token(TokenType.AssignBitAnd)
                     case "&":
                         advance()
                         if current == "=":
                             advance()
-                            make_token(TokenType.AssignLogicAnd, "&&=")
+                            make_token(TokenType.AssignLogicAnd)
                         else:
-                            make_token(TokenType.LogicAnd, "&&")
+                            make_token(TokenType.LogicAnd)
                     case _:
-                        make_token(TokenType.BitAnd, "&")
+                        make_token(TokenType.BitAnd)
 
             case "|":
                 advance()
                 match current:
                     case "=":
                         advance()
-                        make_token(TokenType.AssignBitOr, "|=")
+                        make_token(TokenType.AssignBitOr)
                     case "|":
                         advance()
                         if current == "=":
                             advance()
-                            make_token(TokenType.AssignLogicOr, "||=")
+                            make_token(TokenType.AssignLogicOr)
                         else:
-                            make_token(TokenType.LogicOr, "||")
+                            make_token(TokenType.LogicOr)
                     case _:
-                        make_token(TokenType.BitOr, "|")
+                        make_token(TokenType.BitOr)
 
             case "^":
                 advance()
                 if current == "=":
                     advance()
-                    make_token(TokenType.AssignBitXOr, "^=")
+                    make_token(TokenType.AssignBitXOr)
                 else:
-                    make_token(TokenType.BitXOr, "^")
+                    make_token(TokenType.BitXOr)
 
             case "!":
                 advance()
                 if current == "=":
                     advance()
-                    make_token(TokenType.CompareNotEquals, "!=")
+                    make_token(TokenType.CompareNotEquals)
                 else:
-                    make_token(TokenType.LogicNot, "!")
+                    make_token(TokenType.LogicNot)
 
             case "=":
                 advance()
                 if current == "=":
                     advance()
-                    make_token(TokenType.CompareEquals, "==")
+                    make_token(TokenType.CompareEquals)
                 else:
-                    make_token(TokenType.Assign, "=")
+                    make_token(TokenType.Assign)
 
             case "<":
                 # < <= << <<= <<< <<<=
@@ -317,26 +698,26 @@ def tokenize(code: SourceCode):
                     case "=":
                         # <=
                         advance()
-                        make_token(TokenType.CompareLessEquals, "<=")
+                        make_token(TokenType.CompareLessEquals)
                     case "<":
                         # << <<= <<< <<<=
                         advance()
                         match current:
                             case "=":
                                 advance()
-                                make_token(TokenType.AssignBitShiftLeft, "<<=")
+                                make_token(TokenType.AssignBitShiftLeft)
                             case "<":
                                 advance()
                                 if current == "=":
                                     advance()
-                                    make_token(TokenType.AssignBitRotateLeft, "<<<=")
+                                    make_token(TokenType.AssignBitRotateLeft)
                                 else:
-                                    make_token(TokenType.BitRotateLeft, "<<<")
+                                    make_token(TokenType.BitRotateLeft)
                             case _:
-                                make_token(TokenType.BitShiftLeft, "<<")
+                                make_token(TokenType.BitShiftLeft)
                     case _:
                         # <
-                        make_token(TokenType.CompareLess, "<")
+                        make_token(TokenType.CompareLess)
 
             case ">":
                 # > >= >> >>= >>> >>>=
@@ -345,29 +726,126 @@ def tokenize(code: SourceCode):
                     case "=":
                         # >=
                         advance()
-                        make_token(TokenType.CompareGreaterEquals, ">=")
+                        make_token(TokenType.CompareGreaterEquals)
                     case ">":
                         # >> >>= >>> >>>=
                         advance()
                         match current:
                             case "=":
                                 advance()
-                                make_token(TokenType.AssignBitShiftRight, ">>=")
+                                make_token(TokenType.AssignBitShiftRight)
                             case ">":
                                 advance()
                                 if current == "=":
                                     advance()
-                                    make_token(TokenType.AssignBitRotateRight, ">>>=")
+                                    make_token(TokenType.AssignBitRotateRight)
                                 else:
-                                    make_token(TokenType.BitRotateRight, ">>>")
+                                    make_token(TokenType.BitRotateRight)
                             case _:
-                                make_token(TokenType.BitShiftRight, ">>")
+                                make_token(TokenType.BitShiftRight)
                     case _:
                         # >
-                        make_token(TokenType.CompareGreater, ">")
+                        make_token(TokenType.CompareGreater)
 
             case _:
                 tt = LexemeMaps.Literal.get(current, TokenType.Undefined)
-                make_token(tt, consume())
+                advance()
+                make_token(tt)
+
+    yield from pending
+
+
+class Patterns:
+    # longest lexemes first, so the alternation is maximal munch ("<<<=" before "<<<" before "<<" ...)
+    Fixed = "|".join(re.escape(lexeme) for lexeme in sorted(
+        (*LexemeMaps.Fixed, "--"), key=len, reverse=True
+    ))
+    Master = re.compile("|".join((
+        r"(?P<Newline>\n[ \r\t\n]*)",
+        r"(?P<Space>[ \r\t]+)",
+        r"(?P<Word>[A-Za-z_][A-Za-z0-9_]*)",
+        r"(?P<HexNumber>0x(?:[0-9a-fA-F]+_?)*)",
+        r"(?P<BinNumber>0b(?:[01]+_?)*)",
+        r"(?P<Number>(?:[0-9]+_?)+(?P<Fraction>\.(?:[0-9]+_?)*)?)",
+        r"(?P<Compiler>\#[A-Za-z0-9_]*)",
+        r'(?P<String>"[^"\n]*")',
+        r'(?P<IncompleteString>"[^"\n]*)',
+        r"(?P<LineComment>//[^\n]*)",
+        r"(?P<DocComment>/\*[\s\S]*?\*/)",
+        r"(?P<IncompleteDocComment>/\*[\s\S]*)",
+        f"(?P<Fixed>{Fixed})",
+        r"(?P<Other>[\s\S])",
+    )))
+    Spans = re.compile("|".join((  # what can hold "/*" without opening a doc comment, see split_points
+        r'(?P<String>"[^"\n]*"?)',
+        r"(?P<LineComment>//[^\n]*)",
+        r"(?P<DocComment>/\*[\s\S]*?(?:\*/|\Z))",
+    )))
+    # the same over the bytes of SourceCode.data
+    MasterBytes = re.compile(Master.pattern.encode("ascii"))
+    SpansBytes = re.compile(Spans.pattern.encode("ascii"))
+
+
+class ByteMaps:
+    # LexemeMaps keyed by the ASCII bytes of the lexeme, for matches in SourceCode.data
+    Keyword = {lexeme.encode("ascii"): tt for lexeme, tt in LexemeMaps.Keyword.items()}
+    Compiler = {lexeme.encode("ascii"): tt for lexeme, tt in LexemeMaps.Compiler.items()}
+    Fixed = {lexeme.encode("ascii"): tt for lexeme, tt in LexemeMaps.Fixed.items()}
+
+
+def scan_pattern(code: SourceCode, start: int = 0) -> Iterator[RawToken]:
+    if code.text is None:
+        text, master, maps, semicolon = code.data, Patterns.MasterBytes, ByteMaps, b";"
+    else:
+        text, master, maps, semicolon = code.text, Patterns.Master, LexemeMaps, ";"
+
+    for m in master.finditer(text, start):
+        kind = m.lastgroup
+        if kind == "Space":
+            continue
+
+        start, end = m.span()
+
+        match kind:
+            case "Word":
+                yield (maps.Keyword.get(m.group(), TokenType.Identifier), start, end, None)
+            case "Fixed":
+                tt = maps.Fixed.get(m.group())
+                if tt is None:  # "--"
+                    yield (TokenType.Undefined, start, end, TokenTag.IncompleteNotInitialized)
+                else:
+                    yield (tt, start, end, None)
+            case "Newline":
+                yield (TokenType.Newline, start, end, None)
+            case "DocComment":
+                yield (TokenType.DocComment, start, end, None)
+            case "IncompleteDocComment":
+                yield (TokenType.Undefined, start, end, TokenTag.IncompleteDocComment)
+            case "Number":
+                fraction = m.start("Fraction")
+                if fraction < 0:
+                    yield (TokenType.Integer, start, end, None)
+                elif fraction == end - 1:  # only the "."
+                    yield (TokenType.Undefined, start, end, TokenTag.IncompleteFloatNumber)
+                else:
+                    yield (TokenType.Float, start, end, None)
+            case "HexNumber" | "BinNumber":
+                if end - start <= 2:  # only "0x" or "0b"
+                    yield (TokenType.Undefined, start, end, TokenTag.IncompleteFormatNumber)
+                else:
+                    yield (TokenType.Integer, start, end, TokenTag.HexFormat if kind == "HexNumber" else TokenTag.BinFormat)
+            case "String":
+                yield (TokenType.String, start, end, None)
+            case "IncompleteString":
+                yield (TokenType.Undefined, start, end, TokenTag.IncompleteString)
+                if text[end - 1 : end] == semicolon:
+                    yield (TokenType.Semicolon, end, end, None)
+            case "LineComment":
+                yield (TokenType.LineComment, start, end, None)
+            case "Compiler":
+                tt = maps.Compiler.get(m.group(), TokenType.Undefined)
+                yield (tt, start, end, TokenTag.IncompleteCompilerAction if tt is TokenType.Undefined else None)
+            case _:
+                yield (TokenType.Undefined, start, end, None)
 
-    return LexResult(tokens)
\ No newline at end of file
+    yield (TokenType.EndOfFile, len(text), len(text), None)
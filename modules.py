@@ -0,0 +1,121 @@
+import os
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+from .cache import FrontendCache
+from .constants import ConstantResult, fold_constants
+from .info import Interner, SourceCode
+from .lexer import LexResult, tokenize
+from .nodes import Node, NodeType
+from .parse import Diagnostic, DiagnosticType, ParseResult, build_ast
+
+
+@dataclass(slots=True)
+class Module():
+    path: str  # resolved, the key of the module in its graph
+    code: SourceCode
+    lex_result: LexResult
+    parse_result: ParseResult
+    imports: list[tuple[Node, str | None]] = field(default_factory=list)  # Import node, resolved path or None
+
+
+class ModuleGraph():
+    # every module is read and parsed once, however many modules import it
+    def __init__(self, search_path: Iterable[str] = (), cache: FrontendCache = None):
+        self.search_path = [os.path.abspath(path) for path in search_path]
+        self.cache = cache
+        self.symbols = Interner()  # shared by all modules so symbol ids agree across imports
+        self.modules: dict[str, Module] = {}
+        self.cycles: list[list[str]] = []
+        self.diagnostics: dict[str, list[Diagnostic]] = {}  # import diagnostics by module path
+        self._order: list[Module] = None
+
+    def resolve(self, name: str, importer: str = None) -> str | None:
+        if not os.path.splitext(name)[1]:
+            name += ".bs"
+        directories = [os.path.dirname(importer)] if importer else []
+        for directory in directories + self.search_path:
+            candidate = os.path.join(directory, name)
+            if os.path.isfile(candidate):
+                return os.path.realpath(candidate)
+        return None
+
+    def load(self, path: str) -> Module:
+        root = os.path.realpath(path)
+        pending = [root]
+        while pending:
+            path = pending.pop()
+            if path in self.modules:
+                continue
+            module = self.parse(path)
+            self.modules[path] = module
+            self._order = None
+            for node in module.parse_result.ast.data.globals:
+                if node.type is not NodeType.Import or not node.data.path:
+                    continue
+                target = self.resolve(node.data.path.strip('"'), path)
+                module.imports.append((node, target))
+                if target is not None and target not in self.modules:
+                    pending.append(target)
+        return self.modules[root]
+
+    def parse(self, path: str) -> Module:
+        code = SourceCode.map(path, self.symbols)
+        cached = self.cache.load(code) if self.cache else None
+        if cached:
+            lex_result, parse_result = cached
+        else:
+            lex_result = tokenize(code)
+            parse_result = build_ast(lex_result)
+            if self.cache:
+                self.cache.store(code, lex_result, parse_result)
+        return Module(path, code, lex_result, parse_result)
+
+    def order(self) -> list[Module]:
+        # dependencies before their importers; modules on a cycle are still listed, once
+        if self._order is None:
+            self.link()
+        return self._order
+
+    def constants(self) -> dict[str, ConstantResult]:
+        # folds every module after the ones it imports, so an imported constant is evaluated once, with its module
+        results: dict[str, ConstantResult] = {}
+        for module in self.order():
+            imports = [results[target] for _, target in module.imports if target in results]
+            results[module.path] = fold_constants(module.parse_result.ast, imports)
+        return results
+
+    def link(self):
+        order: list[Module] = []
+        done: set[str] = set()
+        self.cycles = []
+        self.diagnostics = {path: [] for path in self.modules}
+
+        for module in self.modules.values():
+            for node, target in module.imports:
+                if target is None:
+                    self.diagnostics[module.path].append(Diagnostic(DiagnosticType.ImportNotFound, node.range))
+
+        for root in self.modules:
+            if root in done:
+                continue
+            stack = [(root, iter(self.modules[root].imports))]
+            on_stack = {root: 0}
+            while stack:
+                path, imports = stack[-1]
+                for node, target in imports:
+                    if target is None or target in done:
+                        continue
+                    if target in on_stack:
+                        self.cycles.append([p for p, _ in stack[on_stack[target]:]] + [target])
+                        self.diagnostics[path].append(Diagnostic(DiagnosticType.ImportCycle, node.range))
+                        continue
+                    on_stack[target] = len(stack)
+                    stack.append((target, iter(self.modules[target].imports)))
+                    break
+                else:
+                    stack.pop()
+                    del on_stack[path]
+                    done.add(path)
+                    order.append(self.modules[path])
+        self._order = order
@@ -1,13 +1,16 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field, fields
+from enum import Enum, auto
+from functools import cache
 from typing import Generic, TypeVar
 
 from .info import SourceRange
 
 Any = object()
 
-autolist = field(default_factory=list)
+autolist = lambda: field(default_factory=list)  # a Field must not be shared between classes
 node = dataclass(slots=True)
 
 @node
@@ -16,7 +19,7 @@ class _Error():
 
 @node
 class _Module():
-    globals: list[Node] = autolist
+    globals: list[Node] = autolist()
 
 @node
 class _Import():
@@ -25,12 +28,14 @@ class _Import():
 @node
 class _Alias():
     name: str = None
+    symbol: int = None
     value: Node = None
     doc: str = None
 
 @node
 class _Definition():
     name: str = None
+    symbol: int = None
     type: Node = None
     value: Node = None
     doc: str = None
@@ -38,25 +43,66 @@ class _Definition():
 @node
 class _NamedType():
     name: str = None
+    symbol: int = None
 
 @node
 class _FunctionType():
-    parameter: list[Node[NodeType.Parameter]] = autolist
+    parameter: list[Node[NodeType.Parameter]] = autolist()
     return_type: Node = None
 
 @node
 class _Parameter():
     name: str = None
+    symbol: int = None
     type: Node = None
     default_value: Node = None
 
 @node
 class _StructureType():
-    member: list[Node] = autolist
+    member: list[Node] = autolist()
 
 @node
 class _EnumType():
-    member: list[Node] = autolist
+    type: Node = None
+    member: list[Node] = autolist()
+
+@node
+class _Name():
+    name: str = None
+    symbol: int = None
+
+@node
+class _Integer():
+    value: int = None
+
+@node
+class _Float():
+    value: float = None
+
+@node
+class _String():
+    value: str = None
+    symbol: int = None  # of the lexeme, quotes included
+
+@node
+class _Boolean():
+    value: bool = None
+
+@node
+class _Call():
+    callee: Node = None
+    arguments: list[Node] = autolist()
+
+@node
+class _Index():
+    node: Node = None
+    index: Node = None
+
+@node
+class _Member():
+    node: Node = None
+    name: str = None
+    symbol: int = None
 
 @node
 class _Function():
@@ -65,7 +111,7 @@ class _Function():
 
 @node
 class _Block():
-    statements: list[Node] = autolist
+    statements: list[Node] = autolist()
 
 @node
 class _Return():
@@ -158,11 +204,20 @@ class NodeType:
     Parameter = _Parameter
     StructureType = _StructureType
     EnumType = _EnumType
+    Name = _Name
+    Integer = _Integer
+    Float = _Float
+    String = _String
+    Boolean = _Boolean
+    Call = _Call
+    Index = _Index
+    Member = _Member
     Function = _Function
     Block = _Block
     Return = _Return
 
-    Assigment = _Assignment
+    Assignment = _Assignment
+    Assigment = _Assignment  # old spelling
     BinOpAdd = _BinOpAdd
     BinOpSubtract = _BinOpSubtract
     BinOpMultiply = _BinOpMultiply
@@ -204,3 +259,89 @@ class Node(Generic[T]):
 
     def __repr__(self):
         return f"Node(type={self.type.__name__}, data={self.data}, range={self.range})"
+
+
+class LazyNode(Node):
+    # data is built by load(node) on first access and kept, e.g. a function body skipped by an outline parse
+    __slots__ = ("load", "loaded")
+
+    def __init__(self, type: type[T], range: SourceRange, load: Callable[[LazyNode], T]) -> None:
+        self.type = type
+        self.range = range
+        self.load = load
+        self.loaded = None
+
+    @property
+    def data(self):
+        if self.loaded is None:
+            self.loaded = self.load(self)
+            self.load = None
+        return self.loaded
+
+    @data.setter
+    def data(self, value):
+        self.loaded = value
+        self.load = None
+
+    def __repr__(self):
+        if self.loaded is None:
+            return f"LazyNode(type={self.type.__name__}, range={self.range})"
+        return super().__repr__()
+
+
+class FieldKind(Enum):
+    Value = auto()
+    Node = auto()
+    NodeList = auto()
+
+
+@cache
+def field_kinds(type: type) -> tuple[tuple[str, FieldKind], ...]:
+    # annotations are strings here (see __future__ import): "Node[...]" or "list[Node[...]]" hold children
+    kinds = []
+    for f in fields(type):
+        if f.type.startswith("Node"):
+            kinds.append((f.name, FieldKind.Node))
+        elif f.type.startswith("list[Node"):
+            kinds.append((f.name, FieldKind.NodeList))
+        else:
+            kinds.append((f.name, FieldKind.Value))
+    return tuple(kinds)
+
+
+def iter_tree(root: Node, load: bool = True) -> Iterator[Node]:
+    # with load=False a LazyNode not loaded yet is yielded but not entered
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        if not load and type(node) is LazyNode and node.loaded is None:
+            continue
+        for name, kind in field_kinds(node.type):
+            value = getattr(node.data, name)
+            if value is None or kind is FieldKind.Value:
+                continue
+            if kind is FieldKind.Node:
+                stack.append(value)
+            else:
+                stack.extend(reversed(value))
+
+
+def copy_tree(root: Node) -> Node:
+    # a deep copy with ranges of its own, for nodes that appear twice such as the target of "x += 1"
+    copy = Node(root.type, SourceRange(root.range.start, root.range.end))
+    stack = [(root, copy)]
+    while stack:
+        original, duplicate = stack.pop()
+        for name, kind in field_kinds(original.type):
+            value = getattr(original.data, name)
+            if value is not None and kind is FieldKind.Node:
+                child = Node(value.type, SourceRange(value.range.start, value.range.end))
+                stack.append((value, child))
+                value = child
+            elif kind is FieldKind.NodeList:
+                children = [Node(item.type, SourceRange(item.range.start, item.range.end)) for item in value]
+                stack.extend(zip(value, children))
+                value = children
+            setattr(duplicate.data, name, value)
+    return copy
@@ -1,51 +1,236 @@
 
 from dataclasses import dataclass
-from enum import Enum, auto
-from collections import namedtuple
+from bisect import bisect_right
+from collections.abc import Callable, Iterable
+from functools import partial
 
-from .tokens import TokenType, Token
-from .lexer import LexResult
-from .nodes import NodeType, Node
+from .tokens import TokenType, TokenTag, Token
+from .lexer import LexResult, TokenBuffer, TokenStream, materialize
+from .nodes import NodeType, Node, LazyNode, copy_tree, iter_tree
 from .info import SourceRange
+from .diagnostics import Diagnostic, DiagnosticSink, DiagnosticType
+
+# values that end in a closing brace instead of a semicolon
+Braced = (NodeType.StructureType, NodeType.EnumType, NodeType.Function)
+
+Trivia = (TokenType.Newline, TokenType.LineComment, TokenType.DocComment)
+
+
+class Braces:
+    # kinds column values, see parse_segments.matching_brace
+    Open = TokenType.OpenBrace.value
+    Close = TokenType.CloseBrace.value
+
+
+class Precedence:
+    # binding power of the binary operators, higher binds tighter; prefix operators bind tighter than all of them
+    Statement = 0  # lowest a statement starts with, assignments included
+    Assignment = 1
+    Value = 2  # lowest a value starts with
+    LogicOr = 2
+    LogicAnd = 3
+    Compare = 4
+    BitOr = 5
+    BitXOr = 6
+    BitAnd = 7
+    Shift = 8
+    Additive = 9
+    Multiplicative = 10
+    Prefix = 11
+
+
+class OperatorMaps:
+    Binary = {  # token -> (precedence, node type)
+        TokenType.LogicOr: (Precedence.LogicOr, NodeType.BinOpLogicOr),
+        TokenType.LogicAnd: (Precedence.LogicAnd, NodeType.BinOpLogicAnd),
+        TokenType.CompareEquals: (Precedence.Compare, NodeType.BinOpCompareEquals),
+        TokenType.CompareNotEquals: (Precedence.Compare, NodeType.BinOpCompareNotEquals),
+        TokenType.CompareLess: (Precedence.Compare, NodeType.BinOpCompareLess),
+        TokenType.CompareLessEquals: (Precedence.Compare, NodeType.BinOpCompareLessEquals),
+        TokenType.CompareGreater: (Precedence.Compare, NodeType.BinOpCompareGreater),
+        TokenType.CompareGreaterEquals: (Precedence.Compare, NodeType.BinOpCompareGreaterEquals),
+        TokenType.BitOr: (Precedence.BitOr, NodeType.BinOpBitOr),
+        TokenType.BitXOr: (Precedence.BitXOr, NodeType.BinOpBitXOr),
+        TokenType.BitAnd: (Precedence.BitAnd, NodeType.BinOpBitAnd),
+        TokenType.BitShiftLeft: (Precedence.Shift, NodeType.BinOpBitShiftLeft),
+        TokenType.BitRotateLeft: (Precedence.Shift, NodeType.BinOpBitRotateLeft),
+        TokenType.BitShiftRight: (Precedence.Shift, NodeType.BinOpBitShiftRight),
+        TokenType.BitRotateRight: (Precedence.Shift, NodeType.BinOpBitRotateRight),
+        TokenType.Plus: (Precedence.Additive, NodeType.BinOpAdd),
+        TokenType.Minus: (Precedence.Additive, NodeType.BinOpSubtract),
+        TokenType.Asterisk: (Precedence.Multiplicative, NodeType.BinOpMultiply),
+        TokenType.Divide: (Precedence.Multiplicative, NodeType.BinOpDivide),
+        TokenType.Modulo: (Precedence.Multiplicative, NodeType.BinOpModulo),
+    }
+    Assignment = {  # token -> operator applied before assigning, "x += 1" is "x = x + 1"
+        TokenType.Assign: None,
+        TokenType.AssignAdd: NodeType.BinOpAdd,
+        TokenType.AssignSubtract: NodeType.BinOpSubtract,
+        TokenType.AssignMultiply: NodeType.BinOpMultiply,
+        TokenType.AssignDivide: NodeType.BinOpDivide,
+        TokenType.AssignModulo: NodeType.BinOpModulo,
+        TokenType.AssignBitAnd: NodeType.BinOpBitAnd,
+        TokenType.AssignLogicAnd: NodeType.BinOpLogicAnd,
+        TokenType.AssignBitOr: NodeType.BinOpBitOr,
+        TokenType.AssignLogicOr: NodeType.BinOpLogicOr,
+        TokenType.AssignBitXOr: NodeType.BinOpBitXOr,
+        TokenType.AssignBitShiftLeft: NodeType.BinOpBitShiftLeft,
+        TokenType.AssignBitRotateLeft: NodeType.BinOpBitRotateLeft,
+        TokenType.AssignBitShiftRight: NodeType.BinOpBitShiftRight,
+        TokenType.AssignBitRotateRight: NodeType.BinOpBitRotateRight,
+    }
+    Prefix = {
+        TokenType.Plus: NodeType.UnaryOpPlus,
+        TokenType.Minus: NodeType.UnaryOpNegate,
+        TokenType.Asterisk: NodeType.UnaryOpPointer,
+        TokenType.LogicNot: NodeType.UnaryOpLogicNot,
+        TokenType.BitInvert: NodeType.UnaryOpBitInvert,
+        TokenType.Question: NodeType.UnaryOpNullCheck,
+        TokenType.Follow: NodeType.UnaryOpFollow,
+    }
+
+class BudgetSpent(Exception):
+    # raised out of the parse once the DiagnosticSink budget is reached, caught by the module loop
+    pass
 
-class DiagnosticType(Enum):
-    MissingSemicolon = auto()
-    GlobalNotAllowed = auto()
-    ImportExpectedString = auto()
-    DefinitionExpectedColon = auto()
-    TypeNotAllowed = auto()
-    ParameterExpectedName = auto()
-
-@dataclass
-class Diagnostic():
-    type: DiagnosticType
-    range: SourceRange
+@dataclass(slots=True)
+class Segment():
+    # one round of the module loop: a top-level node, or None after error recovery
+    token: int  # index of the first token (trivia included) the segment was parsed from
+    node: Node | None
+    diagnostics: list[Diagnostic]
+    shift: int = 0  # offset delta not yet applied to the node ranges, see ParseResult.settle
+    reported: list[Diagnostic] = None  # ParseResult.diagnostics, for bodies of an outline parse loaded later
 
 @dataclass(slots=True)
 class ParseResult():
     ast: Node
     diagnostics: list[Diagnostic]
-
-
-def build_ast(lex_result: LexResult):
-    tokens = lex_result.tokens
+    segments: list[Segment] = None
+    tokens: TokenBuffer = None  # only kept when parsed from a LexResult, needed by reparse
+    outline: bool = False  # function bodies are LazyNodes, parsed when first read
+
+    def settle(self):
+        # reparse only moves the diagnostics of reused segments, node ranges are shifted here on demand
+        # (bodies not loaded yet take the shift from their own range once they are), and so are the token offsets
+        for segment in self.segments or ():
+            if segment.shift:
+                if segment.node is not None:
+                    for node in iter_tree(segment.node, load=False):
+                        node.range.start += segment.shift
+                        node.range.end += segment.shift
+                segment.shift = 0
+        if self.tokens is not None:
+            self.tokens.settle()
+
+
+def build_ast(lex_result: LexResult | Iterable[Token], outline: bool = False, sink: DiagnosticSink = None):
+    # a LexResult is read from its token list, any other iterable (e.g. lexer.iter_tokens) is pulled lazily;
+    # outline skips function bodies by brace matching, which needs the token list, so it is ignored for an iterable.
+    # sink also gets every diagnostic as it is found, the parse ends early when its budget is spent
+    buffer = lex_result.tokens if isinstance(lex_result, LexResult) else None
+    outline = outline and buffer is not None
+    segments, diagnostics, end = parse_segments(lex_result if buffer is None else buffer, outline=outline, sink=sink)
+    for segment in segments:
+        segment.reported = diagnostics
+    if sink is not None and sink.exhausted:
+        buffer = None  # the segments stop short of the end, reparse has to start over
+    return ParseResult(make_module(segments, end), diagnostics, segments, buffer, outline)
+
+
+def make_module(segments: list[Segment], end: Token):
+    module_node = Node(NodeType.Module, SourceRange.zero())
+    module_node.data.globals = [segment.node for segment in segments if segment.node is not None]
+    module_node.range.expand(end.to_range())
+    return module_node
+
+
+def reparse(previous: ParseResult, lex_result: LexResult, start: int, end: int, length: int):
+    # text[start:end] of the previous source was replaced by length characters, lex_result is the new lex
+    # (see lexer.relex); top-level nodes outside the change are reused and previous must not be used afterwards,
+    # call settle() on the result before reading node ranges
+    if previous.tokens is None:
+        return build_ast(lex_result)
+
+    old, new = previous.tokens, lex_result.tokens
+    old_segments = previous.segments
+    delta = length - (end - start)
+    edit_end = start + length
+
+    # a segment reads up to the first token of the next one, so it can only be kept if the segment
+    # after it still ends before the first token the edit touched (see lexer.relex)
+    changed = old.find(old.ends, start)
+    first = max(bisect_right(old_segments, changed, key=lambda segment: segment.token) - 2, 0)
+
+    boundaries = {segment.token: idx for idx, segment in enumerate(old_segments)}
+    synced: list[int] = []
+
+    def stop(token: int):
+        begin = new.start(token)
+        if begin < edit_end:
+            return False
+        idx = old.find(old.starts, begin - delta)
+        while idx < len(old) and old.start(idx) == begin - delta:
+            if old.kinds[idx] == new.kinds[token] and old.end(idx) + delta == new.end(token):
+                if idx in boundaries:
+                    synced[:] = idx, token
+                    return True
+            idx += 1
+        return False
+
+    restart = old_segments[first].token if old_segments else 0
+    segments, _, eof = parse_segments(new, restart, stop, previous.outline)
+
+    if synced:
+        old_token, new_token = synced
+        tail = old_segments[boundaries[old_token]:]
+        for segment in tail:
+            segment.token += new_token - old_token
+            segment.shift += delta
+            for diagnostic in segment.diagnostics:
+                diagnostic.range.start += delta
+                diagnostic.range.end += delta
+        segments = old_segments[:first] + segments + tail
+        eof = new[len(new) - 1]
+    else:
+        segments = old_segments[:first] + segments
+
+    diagnostics = [diagnostic for segment in segments for diagnostic in segment.diagnostics]
+    for segment in segments:
+        segment.reported = diagnostics
+    return ParseResult(make_module(segments, eof), diagnostics, segments, new, previous.outline)
+
+
+def parse_segments(source: TokenBuffer | Iterable[Token], first: int = 0, stop: Callable[[int], bool] = None,
+                   outline: bool = False, body: bool = False, sink: DiagnosticSink = None):
+    # parses top-level segments starting at token index first, until EndOfFile or until stop(token index) says so;
+    # with body it parses the one block opening at first and returns that node instead of the segments
+    buffer = source if isinstance(source, TokenBuffer) else None
+    if buffer is not None:
+        source = materialize(buffer.code, buffer.raw(first))
+    tokens = TokenStream(source)
+    kinds = bytes(buffer.kinds) if outline else None  # searched for matching braces
+    owner: Segment = None  # of the node being parsed, lazy bodies report to it
 
     diagnostics: list[Diagnostic] = []  # https://microsoft.github.io/language-server-protocol/specifications/lsp/3.17/specification/#diagnostic
-    idx = -1
+    idx = first - 1
+    boundary = first  # index right after the last consumed token, where the next segment begins
     current: Token = None
     doc_comment: str = ""
+    undefined: set[int] = set()  # starts of the Undefined tokens read so far
 
 
     def match(*tt: TokenType):
         return current.type in tt
 
     def advance():
-        nonlocal idx, current, doc_comment
+        nonlocal idx, boundary, current, doc_comment
+        boundary = idx + 1
         newlines = 0
         maybe_doc = None
         while True:
             idx += 1
-            current = tokens[idx]
+            current = next(tokens, current)  # stays on EndOfFile once the stream is drained
             match current.type:
                 case TokenType.Newline:
                     newlines += current.lexeme.count("\n")
@@ -57,6 +242,10 @@ def build_ast(lex_result: LexResult):
                 case TokenType.Identifier:
                     doc_comment = maybe_doc if newlines <= 1 else ""
                     break
+                case TokenType.Undefined:
+                    undefined.add(current.start)
+                    doc_comment = ""
+                    break
                 case _:
                     doc_comment = ""
                     break
@@ -77,7 +266,17 @@ def build_ast(lex_result: LexResult):
             advance()
 
     def add_diagnostic(type: DiagnosticType, range: SourceRange):
-        diagnostics.append(Diagnostic(type, range))
+        if range.start in undefined:
+            return  # an Undefined token is the lexer's to report (see lexer.report), anything said here is a follow-up
+        # own copy, the range passed in usually belongs to a node and keeps growing
+        diagnostic = Diagnostic(type, SourceRange(range.start, range.end))
+        if sink is not None and sink.exhausted:  # spent by the lexer
+            raise BudgetSpent()
+        diagnostics.append(diagnostic)
+        if sink is not None:
+            sink.report(diagnostic)
+            if sink.exhausted:
+                raise BudgetSpent()
 
 
     def expect_semicolon(range: SourceRange):
@@ -89,16 +288,27 @@ def build_ast(lex_result: LexResult):
 
 
     def parse_module():
-        module_node = Node(NodeType.Module, SourceRange.zero())
+        nonlocal owner
+        segments: list[Segment] = []
         while not match(TokenType.EndOfFile):
-            node = switch_global()
+            if stop is not None and stop(boundary):
+                break
+            segment = owner = Segment(boundary, None, None)
+            reported = len(diagnostics)
+            try:
+                node = switch_global()
+            except BudgetSpent:
+                segment.diagnostics = diagnostics[reported:]
+                segments.append(segment)
+                break
             if node.type is NodeType.Error:
                 # error already reported and advanced
-                advance_until(TokenType.Identifier, TokenType.Import)
+                advance_until(TokenType.Identifier, TokenType.Import, TokenType.EndOfFile)
             else:
-                module_node.data.globals.append(node)
-        module_node.range.expand(current.to_range())
-        return module_node
+                segment.node = node
+            segment.diagnostics = diagnostics[reported:]
+            segments.append(segment)
+        return segments
 
     def switch_global():
         match current.type:
@@ -146,23 +356,30 @@ def build_ast(lex_result: LexResult):
                 alias_node = Node(NodeType.Alias, name_tok.to_range().expand(current.to_range()))
                 alias_node.data.doc = doc_str
                 alias_node.data.name = name_tok.lexeme
+                alias_node.data.symbol = name_tok.symbol
                 val = parse_alias_value()
                 alias_node.range.expand(val.range)
                 alias_node.data.value = val
+                if val.type not in Braced:
+                    expect_semicolon(alias_node.range)
                 return alias_node
             case TokenType.Assign:
                 advance()
                 def_node = Node(NodeType.Definition, name_tok.to_range().expand(current.to_range()))
                 def_node.data.doc = doc_str
                 def_node.data.name = name_tok.lexeme
+                def_node.data.symbol = name_tok.symbol
                 val = parse_value()
                 def_node.range.expand(val.range)
                 def_node.data.value = val
+                if val.type not in Braced:
+                    expect_semicolon(def_node.range)
                 return def_node
             case _:
                 def_node = Node(NodeType.Definition, name_tok.to_range().expand(colon.to_range()))
                 def_node.data.doc = doc_str
                 def_node.data.name = name_tok.lexeme
+                def_node.data.symbol = name_tok.symbol
                 type_ = parse_type()
                 def_node.range.expand(type_.range)
                 def_node.data.type = type_
@@ -174,7 +391,8 @@ def build_ast(lex_result: LexResult):
                         val = parse_value()
                         def_node.range.expand(val.range)
                         def_node.data.value = val
-                        expect_semicolon(def_node.range)
+                        if val.type not in Braced:
+                            expect_semicolon(def_node.range)
                     case _:
                         expect_semicolon(def_node.range)  # shorter code for missing semicolon
                 return def_node
@@ -187,6 +405,7 @@ def build_ast(lex_result: LexResult):
                 ident_tok = consume()
                 node = Node(NodeType.NamedType, ident_tok.to_range())
                 node.data.name = ident_tok.lexeme
+                node.data.symbol = ident_tok.symbol
                 return node
             case TokenType.Enumeration:
                 return parse_enum()
@@ -200,13 +419,408 @@ def build_ast(lex_result: LexResult):
                 return node
 
     def parse_type_function():
-        pass
+        node = Node(NodeType.FunctionType, consume().to_range())
+        while not match(TokenType.CloseParenthesis, TokenType.EndOfFile):
+            parameter = parse_parameter()
+            node.data.parameter.append(parameter)
+            node.range.expand(parameter.range)
+            if not consume_if(TokenType.Comma):
+                break
+
+        close = consume_if(TokenType.CloseParenthesis)
+        if close:
+            node.range.expand(close.to_range())
+        else:
+            add_diagnostic(DiagnosticType.FunctionTypeExpectedCloseParenthesis, node.range.to_shrink_to_end())
+
+        if consume_if(TokenType.ReturnArrow):
+            return_type = parse_type()
+            node.range.expand(return_type.range)
+            node.data.return_type = return_type
+        return node
+
+    def parse_parameter():
+        # "name: type = default" or just a type as in "(Result) -> Result"
+        match current.type:
+            case TokenType.Identifier:
+                name_tok = consume()
+                if not consume_if(TokenType.Colon):
+                    type_ = Node(NodeType.NamedType, name_tok.to_range())
+                    type_.data.name = name_tok.lexeme
+                    type_.data.symbol = name_tok.symbol
+                    node = Node(NodeType.Parameter, name_tok.to_range())
+                    node.data.type = type_
+                    return node
+                node = Node(NodeType.Parameter, name_tok.to_range())
+                node.data.name = name_tok.lexeme
+                node.data.symbol = name_tok.symbol
+                type_ = parse_type()
+                node.range.expand(type_.range)
+                node.data.type = type_
+            case TokenType.OpenParenthesis | TokenType.Structure | TokenType.Enumeration:
+                type_ = parse_type()
+                node = Node(NodeType.Parameter, SourceRange(type_.range.start, type_.range.end))
+                node.data.type = type_
+            case _:
+                range = current.to_range()
+                add_diagnostic(DiagnosticType.ParameterExpectedName, range)
+                node = Node(NodeType.Error, range)
+                node.data.diagnostic = DiagnosticType.ParameterExpectedName
+                advance_until(TokenType.Comma, TokenType.CloseParenthesis, TokenType.Semicolon,
+                              TokenType.OpenBrace, TokenType.CloseBrace, TokenType.EndOfFile)
+                return node
+
+        if consume_if(TokenType.Assign):
+            val = parse_value()
+            node.range.expand(val.range)
+            node.data.default_value = val
+        return node
+
+    def parse_struct():
+        node = Node(NodeType.StructureType, consume().to_range())
+        parse_members(node)
+        return node
+
+    def parse_enum():
+        node = Node(NodeType.EnumType, consume().to_range())
+        if not match(TokenType.OpenBrace):
+            type_ = parse_type()
+            node.range.expand(type_.range)
+            node.data.type = type_
+        parse_members(node)
+        return node
+
+    def parse_members(node: Node):
+        # "{ definition* }" of a struct or an enum
+        open = consume_if(TokenType.OpenBrace)
+        if not open:
+            add_diagnostic(DiagnosticType.MembersExpectedOpenBrace, node.range.to_shrink_to_end())
+            return
+        node.range.expand(open.to_range())
+
+        while not match(TokenType.CloseBrace, TokenType.EndOfFile):
+            if match(TokenType.Identifier):
+                member = parse_definition()
+            else:
+                add_diagnostic(DiagnosticType.MemberNotAllowed, current.to_range())
+                member = Node(NodeType.Error, current.to_range())
+                member.data.diagnostic = DiagnosticType.MemberNotAllowed
+                advance()
+            if member.type is NodeType.Error:
+                advance_until(TokenType.Identifier, TokenType.CloseBrace, TokenType.EndOfFile)
+            node.data.member.append(member)
+            node.range.expand(member.range)
+
+        close = consume_if(TokenType.CloseBrace)
+        if close:
+            node.range.expand(close.to_range())
+        else:
+            add_diagnostic(DiagnosticType.MembersExpectedCloseBrace, node.range.to_shrink_to_end())
 
     def parse_alias_value():
-        return Node()
+        return parse_value()
 
     def parse_value():
-        return Node()
+        return parse_expression(Precedence.Value)
 
+    def peek_significant(skip: int = 0):
+        # the token after current (or after skip more), trivia does not count
+        offset = 0
+        while True:
+            tok = tokens.peek(offset)
+            offset += 1
+            if tok is None or tok.type not in Trivia:
+                if tok is None or skip == 0:
+                    return tok
+                skip -= 1
+
+    def starts_function():
+        # on "(": "()" and "(name:" open a function, anything else a parenthesized value
+        after = peek_significant()
+        if after is None:
+            return False
+        if after.type is TokenType.CloseParenthesis:
+            return True
+        following = peek_significant(1)
+        return after.type is TokenType.Identifier and following is not None and following.type is TokenType.Colon
+
+    def parse_expression(min_precedence: int):
+        # precedence climbing over explicit stacks: neither long operator chains, prefix chains nor nested
+        # parentheses recurse, the only recursion is into function bodies and call arguments
+        operands: list[Node] = []
+        operators: list[tuple] = []  # (precedence, node type, token), precedence None marks an open "("
+        floors = [min_precedence]  # lowest precedence accepted, reset to Statement inside parentheses
+
+        def reduce():
+            precedence, type, tok = operators.pop()
+            if precedence == Precedence.Prefix:
+                operand = operands.pop()
+                node = Node(type, SourceRange(tok.start, operand.range.end))
+                node.data.node = operand
+            else:
+                right = operands.pop()
+                left = operands.pop()
+                if precedence == Precedence.Assignment:
+                    if type is not None:
+                        combined = Node(type, SourceRange(left.range.start, right.range.end))
+                        combined.data.left = copy_tree(left)
+                        combined.data.right = right
+                        right = combined
+                    type = NodeType.Assignment
+                node = Node(type, SourceRange(left.range.start, right.range.end))
+                node.data.left = left
+                node.data.right = right
+            operands.append(node)
 
-    return ParseResult(parse_module(), diagnostics)
\ No newline at end of file
+        while True:
+            prefix = OperatorMaps.Prefix.get(current.type)
+            if prefix is not None:
+                operators.append((Precedence.Prefix, prefix, consume()))
+                continue
+            if match(TokenType.OpenParenthesis) and not starts_function():
+                operators.append((None, None, consume()))
+                floors.append(Precedence.Statement)
+                continue
+
+            operands.append(parse_postfix(parse_primary()))
+            if operands[-1].type is NodeType.Error:
+                break
+
+            while match(TokenType.CloseParenthesis) and len(floors) > 1:
+                while operators[-1][0] is not None:
+                    reduce()
+                open = operators.pop()[2]
+                floors.pop()
+                inner = operands[-1]
+                inner.range.start = open.start
+                inner.range.expand(consume().to_range())
+                operands[-1] = parse_postfix(inner)
+
+            if current.type in OperatorMaps.Assignment:
+                precedence, type, right_assoc = Precedence.Assignment, OperatorMaps.Assignment[current.type], True
+            elif current.type in OperatorMaps.Binary:
+                (precedence, type), right_assoc = OperatorMaps.Binary[current.type], False
+            else:
+                break
+            if precedence < floors[-1]:
+                break
+            while operators and operators[-1][0] is not None and (
+                operators[-1][0] > precedence or (operators[-1][0] == precedence and not right_assoc)
+            ):
+                reduce()
+            operators.append((precedence, type, consume()))
+
+        if len(floors) > 1:
+            add_diagnostic(DiagnosticType.ValueExpectedCloseParenthesis, current.to_range())
+        while operators:
+            if operators[-1][0] is None:
+                operators.pop()
+                continue
+            reduce()
+        return operands[-1]
+
+    def parse_primary():
+        tok = current
+        match tok.type:
+            case TokenType.Integer | TokenType.Float:
+                node = Node(NodeType.Integer if tok.type is TokenType.Integer else NodeType.Float, tok.to_range())
+                node.data.value = number_value(tok)
+                if not valid_separators(tok.lexeme):
+                    add_diagnostic(DiagnosticType.IncompleteNumber, tok.to_range())
+            case TokenType.String:
+                node = Node(NodeType.String, tok.to_range())
+                node.data.value = tok.lexeme[1:-1]
+                node.data.symbol = tok.symbol
+            case TokenType.True_ | TokenType.False_:
+                node = Node(NodeType.Boolean, tok.to_range())
+                node.data.value = tok.type is TokenType.True_
+            case TokenType.Identifier:
+                node = Node(NodeType.Name, tok.to_range())
+                node.data.name = tok.lexeme
+                node.data.symbol = tok.symbol
+            case TokenType.OpenParenthesis:
+                return parse_function()
+            case TokenType.Structure:
+                return parse_struct()
+            case TokenType.Enumeration:
+                return parse_enum()
+            case _:
+                range = tok.to_range()
+                add_diagnostic(DiagnosticType.ValueNotAllowed, range)
+                node = Node(NodeType.Error, range)
+                node.data.diagnostic = DiagnosticType.ValueNotAllowed
+                return node
+        advance()
+        return node
+
+    def parse_postfix(node: Node):
+        # calls, indexing and member access bind tighter than any operator, applied left to right
+        while True:
+            match current.type:
+                case TokenType.OpenParenthesis:
+                    call = Node(NodeType.Call, SourceRange(node.range.start, consume().to_range().end))
+                    call.data.callee = node
+                    while not match(TokenType.CloseParenthesis, TokenType.EndOfFile):
+                        argument = parse_value()
+                        call.data.arguments.append(argument)
+                        call.range.expand(argument.range)
+                        if argument.type is NodeType.Error or not consume_if(TokenType.Comma):
+                            break
+                    close = consume_if(TokenType.CloseParenthesis)
+                    if close:
+                        call.range.expand(close.to_range())
+                    else:
+                        add_diagnostic(DiagnosticType.CallExpectedCloseParenthesis, call.range.to_shrink_to_end())
+                    node = call
+                case TokenType.OpenBracket:
+                    index = Node(NodeType.Index, SourceRange(node.range.start, consume().to_range().end))
+                    index.data.node = node
+                    index.data.index = parse_value()
+                    index.range.expand(index.data.index.range)
+                    close = consume_if(TokenType.CloseBracket)
+                    if close:
+                        index.range.expand(close.to_range())
+                    else:
+                        add_diagnostic(DiagnosticType.IndexExpectedCloseBracket, index.range.to_shrink_to_end())
+                    node = index
+                case TokenType.Dot if (after := peek_significant()) is not None and after.type is TokenType.Identifier:
+                    advance()
+                    name_tok = consume()
+                    member = Node(NodeType.Member, SourceRange(node.range.start, name_tok.to_range().end))
+                    member.data.node = node
+                    member.data.name = name_tok.lexeme
+                    member.data.symbol = name_tok.symbol
+                    node = member
+                case _:
+                    return node
+
+    def parse_function():
+        # "(parameters) -> type { statements }", without a block it is a function type
+        header = parse_type_function()
+        if not match(TokenType.OpenBrace):
+            return header
+        node = Node(NodeType.Function, SourceRange(header.range.start, header.range.end))
+        node.data.header = header
+        node.data.block = (outline and skip_block()) or parse_block()
+        node.range.expand(node.data.block.range)
+        return node
+
+    def skip_block():
+        # outline: a LazyNode for the block opening at current, the stream continues at its closing brace
+        nonlocal tokens, idx
+        close = matching_brace(idx)
+        if close is None:
+            return None  # unbalanced, parsed now so the missing brace gets reported
+        node = LazyNode(NodeType.Block, SourceRange(current.start, buffer.end(close)),
+                        partial(load_body, buffer, idx, owner))
+        tokens = TokenStream(materialize(buffer.code, buffer.raw(close)))
+        idx = close - 1
+        advance()
+        advance()
+        return node
+
+    def matching_brace(open: int):
+        depth = 0
+        pos = open
+        next_open = kinds.find(Braces.Open, pos)
+        while True:
+            next_close = kinds.find(Braces.Close, pos)
+            if next_close < 0:
+                return None
+            if 0 <= next_open < next_close:
+                depth += 1
+                pos = next_open + 1
+                next_open = kinds.find(Braces.Open, pos)
+            else:
+                depth -= 1
+                pos = next_close + 1
+                if depth == 0:
+                    return next_close
+
+    def parse_block():
+        open = consume_if(TokenType.OpenBrace)
+        node = Node(NodeType.Block, open.to_range() if open else current.to_range().to_shrink_to_start())
+        if not open:
+            add_diagnostic(DiagnosticType.BlockExpectedOpenBrace, node.range)
+            return node
+
+        while not match(TokenType.CloseBrace, TokenType.EndOfFile):
+            statement = parse_statement()
+            node.data.statements.append(statement)
+            node.range.expand(statement.range)
+            if statement.type is NodeType.Error:
+                advance_until(TokenType.Semicolon, TokenType.OpenBrace, TokenType.CloseBrace, TokenType.EndOfFile)
+                consume_if(TokenType.Semicolon)
+
+        close = consume_if(TokenType.CloseBrace)
+        if close:
+            node.range.expand(close.to_range())
+        else:
+            add_diagnostic(DiagnosticType.BlockExpectedCloseBrace, node.range.to_shrink_to_end())
+        return node
+
+    def parse_statement():
+        match current.type:
+            case TokenType.OpenBrace:
+                return parse_block()
+            case TokenType.Identifier if current.lexeme == "return":
+                return parse_return()
+            case TokenType.Identifier if (after := peek_significant()) is not None and after.type is TokenType.Colon:
+                return parse_definition()
+        node = parse_expression(Precedence.Statement)
+        if node.type is not NodeType.Error:
+            expect_semicolon(node.range)
+        return node
+
+    def parse_return():
+        node = Node(NodeType.Return, consume().to_range())
+        if not match(TokenType.Semicolon):
+            value = parse_value()
+            node.range.expand(value.range)
+            node.data.node = value
+            if value.type is NodeType.Error:
+                return node
+        expect_semicolon(node.range)
+        return node
+
+
+    if body:
+        return parse_block(), diagnostics, current
+    segments = parse_module()
+    return segments, diagnostics, current
+
+
+def load_body(buffer: TokenBuffer, first: int, owner: Segment, node: LazyNode):
+    # parses a body skipped by an outline parse; node.range has been shifted by any reparse since, so has the result
+    block, diagnostics, _ = parse_segments(buffer, first, body=True)
+    delta = node.range.start - buffer.start(first)
+    if delta:
+        for child in iter_tree(block):
+            child.range.start += delta
+            child.range.end += delta
+        for diagnostic in diagnostics:
+            diagnostic.range.start += delta
+            diagnostic.range.end += delta
+    if owner is not None:  # None inside a body, which loads its own bodies right away
+        owner.diagnostics.extend(diagnostics)
+        if owner.reported is not None:
+            owner.reported.extend(diagnostics)
+    return block.data
+
+
+def number_value(tok: Token) -> int | float:
+    # the lexer takes a separator after every digit group, python only between digits
+    digits = tok.lexeme.replace("_", "")
+    match tok.tag:
+        case TokenTag.HexFormat:
+            return int(digits, 16)
+        case TokenTag.BinFormat:
+            return int(digits, 2)
+    if tok.type is TokenType.Float:
+        return float(digits)
+    return int(digits, 10)
+
+
+def valid_separators(lexeme: str) -> bool:
+    # "1_", "0x1_" and "1_.5" end a digit group on a separator
+    return not lexeme.endswith("_") and "_." not in lexeme
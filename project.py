@@ -0,0 +1,131 @@
+import glob
+import os
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+
+from .cache import FrontendCache
+from .checker import check_type
+from .constants import fold_constants
+from .info import SourceCode, SourceLocation
+from .diagnostics import DiagnosticSink
+from .lexer import report_tokens, tokenize_parallel
+from .nodes import iter_tree
+from .parse import DiagnosticType, build_ast
+from .stats import Stats
+
+
+@dataclass(slots=True)
+class FileResult():
+    # what a worker sends back: plain values and arrays only, never the tokens or the AST
+    path: str
+    tokens: int
+    nodes: int
+    diagnostics: list[tuple[DiagnosticType, int, int]]  # type, start offset, end offset
+    line_starts: array
+    error: str = None  # the front end raised instead of reporting diagnostics
+    stats: Stats = None
+
+    def location(self, offset: int):
+        line = bisect_right(self.line_starts, offset) - 1
+        return SourceLocation(line, offset - self.line_starts[line])
+
+
+def discover(root: str | Path, pattern: str = "*.bs") -> list[str]:
+    return sorted(str(path) for path in Path(root).rglob(pattern) if path.is_file())
+
+
+def expand(arguments: list[str], pattern: str = "*.bs") -> list[str]:
+    # files as given, directories searched for pattern, anything else taken as a glob; each path once, in order
+    paths = {}
+    for argument in arguments:
+        if os.path.isdir(argument):
+            matches = discover(argument, pattern)
+        elif os.path.exists(argument):
+            matches = [argument]
+        else:
+            matches = []
+            for match in sorted(glob.glob(argument, recursive=True)):
+                matches.extend(discover(match, pattern) if os.path.isdir(match) else [match])
+        paths.update(dict.fromkeys(matches))
+    return list(paths)
+
+
+def compile_file(path: str, cache_dir: str = None, stats: bool = False, lex_jobs: int = 1, max_errors: int = None):
+    # lexer, parser and checker diagnostics in that order; with max_errors the file is only read that far
+    counters = Stats(enabled=stats)
+    sink = DiagnosticSink(budget=max_errors)
+    code = None
+    try:
+        with counters.phase("read"):
+            code = SourceCode.map(path)
+            code.location(0)  # builds code.line_starts
+        counters.count_source(code)
+
+        cache = FrontendCache(cache_dir) if cache_dir else None
+        cached = None
+        if cache:
+            with counters.phase("cache"):
+                cached = cache.load(code)
+        if cached:
+            lex_result, parse_result = cached
+            report_tokens(lex_result.tokens, sink)
+            sink.extend(parse_result.diagnostics)
+        else:
+            with counters.phase("lex"):
+                lex_result = tokenize_parallel(code, jobs=lex_jobs, sink=sink)
+            with counters.phase("parse"):
+                parse_result = build_ast(lex_result, sink=sink)
+            if cache and not sink.exhausted:  # never store a parse cut short
+                with counters.phase("cache"):
+                    cache.store(code, lex_result, parse_result)
+        if not sink.exhausted:
+            with counters.phase("fold"):  # after the cache store, the entry keeps the tree as parsed
+                sink.extend(fold_constants(parse_result.ast).diagnostics)
+            with counters.phase("check"):
+                sink.extend(check_type(parse_result.ast).diagnostics)
+    except Exception as e:  # an unreadable or vanished file included, it is reported like any other failure
+        line_starts = code.line_starts if code is not None else array("I", [0])
+        return FileResult(path, 0, 0, [], line_starts, f"{type(e).__name__}: {e}", counters if stats else None)
+
+    counters.count_tokens(lex_result)
+    counters.count_nodes(parse_result.ast)
+    diagnostics = sink.diagnostics
+    counters.count_diagnostics(diagnostics)
+    return FileResult(
+        path,
+        len(lex_result.tokens),
+        sum(1 for _ in iter_tree(parse_result.ast)),
+        [(d.type, d.range.start, d.range.end) for d in diagnostics],
+        code.line_starts,
+        stats=counters if stats else None,
+    )
+
+
+def build_project(paths: list[str], jobs: int = None, cache_dir: str = None, stats: bool = False,
+                  max_errors: int = None) -> list[FileResult]:
+    return list(iter_project(paths, jobs, cache_dir, stats, max_errors))
+
+
+def iter_project(paths: list[str], jobs: int = None, cache_dir: str = None, stats: bool = False,
+                 max_errors: int = None) -> Iterator[FileResult]:
+    # results come in the order of paths, whatever order the workers finish in; closing the iterator
+    # early cancels the files not started yet
+    jobs = jobs or os.cpu_count() or 1
+    if len(paths) == 1:  # the workers go to lexing the one file instead
+        yield compile_file(paths[0], cache_dir, stats, jobs, max_errors)
+        return
+    work = partial(compile_file, cache_dir=cache_dir, stats=stats, max_errors=max_errors)
+    if jobs == 1:
+        yield from map(work, paths)
+        return
+
+    pool = ProcessPoolExecutor(min(jobs, len(paths)))
+    try:
+        yield from pool.map(work, paths, chunksize=max(1, len(paths) // (jobs * 8)))
+    finally:
+        pool.shutdown(cancel_futures=True)
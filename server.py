@@ -0,0 +1,373 @@
+import asyncio
+import json
+import sys
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+from .index import DefinitionKind, Symbol, SymbolIndex
+from .info import SourceCode
+from .diagnostics import DiagnosticSink
+from .lexer import LexResult, relex, report_tokens, tokenize
+from .nodes import NodeType
+from .parse import ParseResult, build_ast, reparse
+from .project import discover
+from .tokens import TokenType
+
+# https://microsoft.github.io/language-server-protocol/specifications/lsp/3.17/specification/
+class ErrorCode:
+    MethodNotFound = -32601
+    InternalError = -32603
+
+class SymbolKind:
+    Field = 8
+    Enum = 10
+    Function = 12
+    Variable = 13
+    Constant = 14
+    EnumMember = 22
+    Struct = 23
+
+    Definitions = {  # index.DefinitionKind -> SymbolKind
+        DefinitionKind.Constant: Constant,
+        DefinitionKind.Variable: Variable,
+        DefinitionKind.Function: Function,
+        DefinitionKind.Structure: Struct,
+        DefinitionKind.Enumeration: Enum,
+    }
+
+class Severity:
+    Error = 1
+
+class SyncKind:
+    Incremental = 2
+
+
+@dataclass(slots=True)
+class Document():
+    uri: str
+    version: int
+    lex_result: LexResult
+    parse_result: ParseResult
+    pending: list[dict] = field(default_factory=list)  # contentChanges not lexed yet
+    timer: asyncio.TimerHandle = None
+    indexed: bool = False  # the symbol index holds the current text, edits only reset this
+
+    @property
+    def code(self) -> SourceCode:
+        return self.lex_result.tokens.code
+
+
+class LanguageServer():
+    def __init__(self, reader: asyncio.StreamReader, writer, debounce: float = 0.005, index: SymbolIndex = None):
+        self.reader = reader
+        self.writer = writer
+        self.debounce = debounce
+        self.documents: dict[str, Document] = {}
+        self.index = index if index is not None else SymbolIndex()  # the workspace, open documents as edited
+        self.max_symbols = 1000  # per workspace/symbol answer
+        self.utf16 = True  # position encoding, utf-32 when the client offers it
+        self.running = True
+
+    # transport
+
+    async def serve(self):
+        while self.running:
+            message = await self.read_message()
+            if message is None:
+                break
+            self.dispatch(message)
+
+    async def read_message(self):
+        length = None
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return None
+            line = line.strip()
+            if not line:
+                break
+            name, _, value = line.decode("ascii").partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        if length is None:
+            return None
+        return json.loads(await self.reader.readexactly(length))
+
+    def send(self, message: dict):
+        body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        self.writer.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+        self.writer.flush()
+
+    def respond(self, id, result=None, error: tuple[int, str] = None):
+        if error:
+            self.send({"jsonrpc": "2.0", "id": id, "error": {"code": error[0], "message": error[1]}})
+        else:
+            self.send({"jsonrpc": "2.0", "id": id, "result": result})
+
+    def notify(self, method: str, params: dict):
+        self.send({"jsonrpc": "2.0", "method": method, "params": params})
+
+    def dispatch(self, message: dict):
+        # a failing handler answers its request with an error, the server keeps running
+        id = message.get("id")
+        try:
+            self.handle(message.get("method"), message.get("params") or {}, id)
+        except Exception as e:
+            if id is not None:
+                self.respond(id, error=(ErrorCode.InternalError, f"{type(e).__name__}: {e}"))
+            else:
+                print(f"biskuit: {message.get('method')} failed: {type(e).__name__}: {e}", file=sys.stderr)
+
+    def handle(self, method: str, params: dict, id):
+        match method:
+            case "initialize":
+                self.respond(id, self.initialize(params))
+            case "shutdown":
+                self.index.save()
+                self.respond(id, None)
+            case "exit":
+                self.running = False
+            case "textDocument/didOpen":
+                self.did_open(params["textDocument"])
+            case "textDocument/didChange":
+                self.did_change(params["textDocument"], params["contentChanges"])
+            case "textDocument/didClose":
+                self.did_close(params["textDocument"]["uri"])
+            case "textDocument/documentSymbol":
+                self.respond(id, self.document_symbols(params["textDocument"]["uri"]))
+            case "textDocument/definition":
+                self.respond(id, self.definition(params["textDocument"]["uri"], params["position"]))
+            case "workspace/symbol":
+                self.respond(id, self.workspace_symbols(params.get("query", "")))
+            case _ if id is not None:
+                self.respond(id, error=(ErrorCode.MethodNotFound, f"unsupported method {method}"))
+
+    # lifecycle
+
+    def initialize(self, params: dict):
+        encodings = params.get("capabilities", {}).get("general", {}).get("positionEncodings", [])
+        self.utf16 = "utf-32" not in encodings
+        root = params.get("rootUri")
+        if root:
+            self.index.refresh(discover(unquote(urlparse(root).path)))
+            self.index.save()
+        return {
+            "capabilities": {
+                "positionEncoding": "utf-16" if self.utf16 else "utf-32",
+                "textDocumentSync": {"openClose": True, "change": SyncKind.Incremental},
+                "documentSymbolProvider": True,
+                "definitionProvider": True,
+                "workspaceSymbolProvider": True,
+            },
+            "serverInfo": {"name": "biskuit"},
+        }
+
+    # documents
+
+    def did_open(self, item: dict):
+        code = SourceCode(unquote(urlparse(item["uri"]).path), item["text"])
+        lex_result = tokenize(code)
+        document = Document(item["uri"], item.get("version", 0), lex_result, build_ast(lex_result))
+        self.documents[document.uri] = document
+        self.publish(document)
+
+    def did_change(self, item: dict, changes: list[dict]):
+        document = self.documents.get(item["uri"])
+        if document is None:
+            return
+        document.version = item.get("version", document.version)
+        # positions of later changes refer to the text after the earlier ones, so they are converted in flush
+        document.pending.extend(changes)
+        if document.timer:
+            document.timer.cancel()
+        document.timer = asyncio.get_running_loop().call_later(self.debounce, self.flush_and_publish, document)
+
+    def did_close(self, uri: str):
+        document = self.documents.pop(uri, None)
+        if document and document.timer:
+            document.timer.cancel()
+        if document:
+            self.index.update(document.code.name)  # unsaved edits are dropped, back to the file
+        self.notify("textDocument/publishDiagnostics", {"uri": uri, "diagnostics": []})
+
+    def flush(self, document: Document):
+        # each change leaves pending once applied, if one raises the ones before it are not applied again
+        document.timer = None
+        if document.pending:
+            document.indexed = False
+        while document.pending:
+            change = document.pending[0]
+            code = document.code
+            if "range" not in change:
+                self.replace(document, SourceCode(code.name, change["text"], code.symbols))
+            else:
+                start = self.offset(code, change["range"]["start"])
+                end = self.offset(code, change["range"]["end"])
+                try:
+                    lex_result = relex(document.lex_result, start, end, change["text"])
+                    parse_result = reparse(document.parse_result, lex_result, start, end, len(change["text"]))
+                except Exception:
+                    # the old results may be half updated, start over from the edited text
+                    text = code.text[:start] + change["text"] + code.text[end:]
+                    self.replace(document, SourceCode(code.name, text, code.symbols))
+                else:
+                    document.lex_result, document.parse_result = lex_result, parse_result
+            del document.pending[0]
+
+    def replace(self, document: Document, code: SourceCode):
+        lex_result = tokenize(code)
+        document.parse_result = build_ast(lex_result)
+        document.lex_result = lex_result
+
+    def flush_and_publish(self, document: Document):
+        if self.documents.get(document.uri) is document:
+            self.flush(document)
+            self.publish(document)
+
+    def reindex(self):
+        # settling and indexing cost a pass over the whole document, so they wait for a request that reads the index
+        for document in self.documents.values():
+            if document.pending:
+                self.flush(document)
+            if not document.indexed:
+                document.parse_result.settle()
+                self.index.update_code(document.code.name, document.code, document.parse_result.ast)
+                document.indexed = True
+
+    def publish(self, document: Document):
+        # the parser leaves Undefined tokens to the lexer, they are found in the kinds column
+        code = document.code
+        lexed = DiagnosticSink()
+        report_tokens(document.lex_result.tokens, lexed)
+        self.notify("textDocument/publishDiagnostics", {
+            "uri": document.uri,
+            "version": document.version,
+            "diagnostics": [{
+                "range": self.range(code, d.range),
+                "severity": Severity.Error,
+                "source": "biskuit",
+                "code": d.type.name,
+                "message": d.type.name,
+            } for d in lexed.diagnostics + document.parse_result.diagnostics],
+        })
+
+    def document_symbols(self, uri: str):
+        document = self.documents.get(uri)
+        if document is None:
+            return []
+        if document.pending:
+            self.flush(document)
+        document.parse_result.settle()
+        code = document.code
+        return [self.symbol(code, node) for node in document.parse_result.ast.data.globals if node.type is not NodeType.Import]
+
+    def symbol(self, code: SourceCode, node):
+        value = node.data.value
+        kind = SymbolKind.Variable
+        children = []
+        if node.type is NodeType.Alias:
+            kind = SymbolKind.Constant
+        shape = value if value is not None else node.data.type
+        if shape is not None:
+            match shape.type:
+                case NodeType.Function:
+                    kind = SymbolKind.Function
+                case NodeType.StructureType:
+                    kind = SymbolKind.Struct
+                    children = [self.symbol(code, member) for member in shape.data.member if member.type is not NodeType.Error]
+                    for child in children:
+                        child["kind"] = SymbolKind.Field
+                case NodeType.EnumType:
+                    kind = SymbolKind.Enum
+                    children = [self.symbol(code, member) for member in shape.data.member if member.type is not NodeType.Error]
+                    for child in children:
+                        child["kind"] = SymbolKind.EnumMember
+        range = self.range(code, node.range)
+        name_end = node.range.start + len(node.data.name)
+        symbol = {
+            "name": node.data.name,
+            "kind": kind,
+            "range": range,
+            "selectionRange": {"start": range["start"], "end": self.position(code, name_end)},
+        }
+        if node.data.doc:
+            symbol["detail"] = node.data.doc
+        if children:
+            symbol["children"] = children
+        return symbol
+
+    def workspace_symbols(self, query: str):
+        self.reindex()
+        return [{
+            "name": symbol.name,
+            "kind": SymbolKind.Definitions[symbol.kind],
+            "location": self.location(symbol),
+        } for symbol in self.index.prefix(query, self.max_symbols)]
+
+    def definition(self, uri: str, position: dict):
+        # the top-level definitions named like the identifier under the cursor
+        document = self.documents.get(uri)
+        if document is None:
+            return []
+        self.reindex()
+        tokens = document.lex_result.tokens
+        tokens.settle()  # done by reindex unless the document was indexed already
+        offset = self.offset(document.code, position)
+        idx = bisect_right(tokens.starts, offset) - 1
+        if idx < 0 or tokens.type(idx) is not TokenType.Identifier or offset > tokens.ends[idx]:
+            return []
+        return [self.location(symbol) for symbol in self.index.exact(tokens.lexeme(idx))]
+
+    def location(self, symbol: Symbol) -> dict:
+        # columns are counted in code points when indexing, exact for utf-16 as well unless a line has astral characters
+        start, end = symbol.location
+        return {
+            "uri": Path(symbol.path).absolute().as_uri(),
+            "range": {
+                "start": {"line": start.line, "character": start.column},
+                "end": {"line": end.line, "character": end.column},
+            },
+        }
+
+    # positions
+
+    def offset(self, code: SourceCode, position: dict) -> int:
+        code.location(0)  # makes sure the line table exists
+        line = min(position["line"], len(code.line_starts) - 1)
+        start = code.line_starts[line]
+        column = position["character"]
+        if self.utf16:
+            column = utf16_to_column(code.text, start, column)
+        return min(start + column, len(code.text))
+
+    def position(self, code: SourceCode, offset: int) -> dict:
+        location = code.location(offset)
+        column = location.column
+        if self.utf16:
+            line_start = offset - column
+            column = len(code.text[line_start:offset].encode("utf-16-le")) // 2
+        return {"line": location.line, "character": column}
+
+    def range(self, code: SourceCode, range) -> dict:
+        return {"start": self.position(code, range.start), "end": self.position(code, range.end)}
+
+
+def utf16_to_column(text: str, line_start: int, units: int) -> int:
+    column = 0
+    while units > 0 and line_start + column < len(text) and text[line_start + column] != "\n":
+        units -= 2 if ord(text[line_start + column]) > 0xFFFF else 1
+        column += 1
+    return column
+
+
+async def serve_stdio(debounce: float = 0.005, index_path: str = None):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    index = SymbolIndex(index_path)
+    try:
+        await LanguageServer(reader, sys.stdout.buffer, debounce, index).serve()
+    finally:
+        index.save()
@@ -0,0 +1,80 @@
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from time import perf_counter, process_time
+
+from .info import SourceCode
+from .lexer import LexResult
+from .nodes import Node, iter_tree
+from .parse import Diagnostic, DiagnosticType
+from .tokens import TokenType
+
+Phases = ("read", "cache", "lex", "parse", "check")
+
+
+@dataclass(slots=True)
+class Stats():
+    # everything is counted after a phase from its result, so a disabled Stats costs one check per phase
+    enabled: bool = True
+    files: int = 0
+    bytes: int = 0
+    wall: Counter[str] = field(default_factory=Counter)  # seconds per phase
+    cpu: Counter[str] = field(default_factory=Counter)
+    tokens: Counter[TokenType] = field(default_factory=Counter)
+    nodes: Counter[str] = field(default_factory=Counter)  # by NodeType name
+    diagnostics: Counter[DiagnosticType] = field(default_factory=Counter)
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        wall, cpu = perf_counter(), process_time()
+        try:
+            yield
+        finally:
+            self.wall[name] += perf_counter() - wall
+            self.cpu[name] += process_time() - cpu
+
+    def count_source(self, code: SourceCode):
+        if self.enabled:
+            self.files += 1
+            self.bytes += len(code.data) if code.text is None else len(code.text.encode("utf-8"))
+
+    def count_tokens(self, lex_result: LexResult):
+        if self.enabled:
+            self.tokens.update(lex_result.tokens.counts())
+
+    def count_nodes(self, ast: Node):
+        if self.enabled:
+            self.nodes.update(node.type.__name__.lstrip("_") for node in iter_tree(ast))
+
+    def count_diagnostics(self, diagnostics: list[Diagnostic]):
+        if self.enabled:
+            self.diagnostics.update(diagnostic.type for diagnostic in diagnostics)
+
+    def merge(self, other: "Stats"):
+        self.files += other.files
+        self.bytes += other.bytes
+        for mine, theirs in ((self.wall, other.wall), (self.cpu, other.cpu), (self.tokens, other.tokens),
+                             (self.nodes, other.nodes), (self.diagnostics, other.diagnostics)):
+            mine.update(theirs)
+        return self
+
+    @property
+    def total(self):
+        return sum(self.wall.values())
+
+    def report(self, out=sys.stderr):
+        print(f"{self.files} files, {self.bytes} bytes, {sum(self.tokens.values())} tokens, "
+              f"{sum(self.nodes.values())} nodes, {sum(self.diagnostics.values())} diagnostics", file=out)
+        print(f"{'phase':<12} {'wall ms':>10} {'cpu ms':>10}", file=out)
+        for name in (*Phases, *sorted(self.wall.keys() - set(Phases))):
+            if name in self.wall:
+                print(f"{name:<12} {self.wall[name] * 1e3:10.2f} {self.cpu[name] * 1e3:10.2f}", file=out)
+        for title, counts in (("tokens", self.tokens), ("nodes", self.nodes), ("diagnostics", self.diagnostics)):
+            if counts:
+                print(f"{title}:", file=out)
+                for key, count in counts.most_common():
+                    print(f"  {getattr(key, 'name', key):<26} {count:>10}", file=out)
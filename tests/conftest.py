@@ -0,0 +1,30 @@
+import importlib
+import random
+import sys
+from pathlib import Path
+
+# the repository is the package itself, its modules import each other relatively
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT.parent))
+
+
+def module(name: str):
+    return importlib.import_module(f"{ROOT.name}.{name}")
+
+
+Pieces = ["", "x", " ", "\n", "1_", "0x", "{", "}", '"', "//", "/*", "*/", ";", "::", "abc := 1;\n"]
+
+
+def corpus(seed: int, size: int = 4000) -> str:
+    return "".join(module("bench").generate(size, seed))
+
+
+def edits(text: str, seed: int, count: int):
+    # (start, end, replacement) of count random edits, each against the text the ones before it left
+    rng = random.Random(seed)
+    for _ in range(count):
+        start = rng.randrange(len(text) + 1)
+        end = min(len(text), start + rng.choice([0, 0, 1, 3, 10, 40]))
+        replacement = rng.choice(Pieces)
+        yield start, end, replacement
+        text = text[:start] + replacement + text[end:]
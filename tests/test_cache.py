@@ -0,0 +1,39 @@
+import zlib
+
+from conftest import module
+
+bench = module("bench")
+cache = module("cache")
+info = module("info")
+lexer = module("lexer")
+nodes = module("nodes")
+parse = module("parse")
+
+
+def outline(result):
+    return [(n.type, n.range.start, n.range.end) for n in nodes.iter_tree(result.ast)], \
+        [(d.type, d.range.start, d.range.end) for d in result.diagnostics]
+
+
+def test_entry_round_trip(tmp_path):
+    code = info.SourceCode("<test>", "".join(bench.generate(20000, seed=1)) + "x :: 1_;\ny := (;\n")
+    lex_result = lexer.tokenize(code)
+    parse_result = parse.build_ast(lex_result)
+    frontend = cache.FrontendCache(tmp_path)
+    frontend.store(code, lex_result, parse_result)
+    loaded_lex, loaded_parse = frontend.load(code)
+    assert loaded_lex.tokens.kinds == lex_result.tokens.kinds
+    assert loaded_lex.tokens.starts == lex_result.tokens.starts
+    assert outline(loaded_parse) == outline(parse_result)
+    assert any(d.type is parse.DiagnosticType.IncompleteNumber for d in loaded_parse.diagnostics)
+
+
+def test_foreign_entry_is_dropped(tmp_path):
+    code = info.SourceCode("<test>", "x :: 1;\n")
+    frontend = cache.FrontendCache(tmp_path)
+    lex_result = lexer.tokenize(code)
+    frontend.store(code, lex_result, parse.build_ast(lex_result))
+    path = frontend.path(code)
+    path.write_bytes(cache.MAGIC + zlib.compress(b"\x80\x04\x95junk"))  # e.g. a pickle from an older version
+    assert frontend.load(code) is None
+    assert not path.exists()
@@ -0,0 +1,73 @@
+import pytest
+
+from conftest import module
+
+checker = module("checker")
+info = module("info")
+lexer = module("lexer")
+parse = module("parse")
+
+DiagnosticType = parse.DiagnosticType
+
+
+def check(text: str):
+    ast = parse.build_ast(lexer.tokenize(info.SourceCode("<test>", text))).ast
+    return [(d.type, text[d.range.start : d.range.end]) for d in checker.check_type(ast).diagnostics]
+
+
+def test_function_header_and_body():
+    assert check("main :: (a: Bogus) -> Nope { b : Foo = 1; return zzz; }") == [
+        (DiagnosticType.UnknownType, "Bogus"),
+        (DiagnosticType.UnknownType, "Nope"),
+        (DiagnosticType.UnknownType, "Foo"),
+        (DiagnosticType.UnknownName, "zzz"),
+    ]
+
+
+def test_function_value():
+    assert check("g :: () {} y : i32 = g;") == [(DiagnosticType.TypeMismatch, "g")]
+
+
+def test_parameters_and_nested_blocks():
+    assert check("f :: (a: i32) -> bool { x := a; { y := x; return y; } return b; }") == [
+        (DiagnosticType.TypeMismatch, "y"),
+        (DiagnosticType.UnknownName, "b"),
+    ]
+
+
+def test_statements_in_blocks():
+    assert check('f :: () { y: i32; y = "s"; y += 1; }') == [(DiagnosticType.TypeMismatch, '"s"')]
+
+
+@pytest.mark.parametrize("text, found", [
+    ('x : i32 = 1 + "s";', '1 + "s"'),
+    ("x : i32 = 1.5 * 2;", "1.5 * 2"),
+    ("x := 1 << 2.0;", "1 << 2.0"),
+    ('x := 1 == "s";', '1 == "s"'),
+    ("x := 1 && true;", "1 && true"),
+])
+def test_binary(text, found):
+    assert check(text) == [(DiagnosticType.TypeMismatch, found)]
+
+
+@pytest.mark.parametrize("text", ["x : f32 = 1.5 * 2;", "x : bool = 1 < 2 && !false;", "x : u8 = 1 << 3 | 1;"])
+def test_binary_fits(text):
+    assert check(text) == []
+
+
+@pytest.mark.parametrize("text, found", [('x := -"s";', '"s"'), ("x := ~1.5;", "1.5"), ("x := !1;", "1")])
+def test_unary(text, found):
+    assert check(text) == [(DiagnosticType.TypeMismatch, found)]
+
+
+def test_call():
+    declarations = "f :: (a: i32) -> i32 { return a; } n : i32 = 1;"
+    assert check(declarations + "x : i32 = f(2);") == []
+    assert check(declarations + "x : string = f(2);") == [(DiagnosticType.TypeMismatch, "f(2)")]
+    assert check(declarations + 'x := f("s");') == [(DiagnosticType.TypeMismatch, '"s"')]
+    assert check(declarations + "x := f(1, 2);") == [(DiagnosticType.TypeMismatch, "f(1, 2)")]
+    assert check(declarations + "x := n(1);") == [(DiagnosticType.TypeMismatch, "n")]
+
+
+def test_long_operator_chain():
+    assert check("x : i32 = " + "1 + " * 20000 + '"s";') == [(DiagnosticType.TypeMismatch, "1 + " * 20000 + '"s"')]
@@ -0,0 +1,74 @@
+import pytest
+
+from conftest import corpus, edits, module
+
+diagnostics = module("diagnostics")
+info = module("info")
+lexer = module("lexer")
+
+
+def columns(tokens):
+    tokens.settle()
+    return list(tokens.kinds), list(tokens.tags), list(tokens.starts), list(tokens.ends)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_relex_matches_tokenize(seed):
+    text = corpus(seed)
+    lex_result = lexer.tokenize(info.SourceCode("<test>", text))
+    for start, end, replacement in edits(text, seed, 20):
+        lex_result = lexer.relex(lex_result, start, end, replacement)
+        text = text[:start] + replacement + text[end:]
+        tokens, fresh = lex_result.tokens, lexer.tokenize(info.SourceCode("<test>", text)).tokens
+        assert [tokens.end(idx) for idx in range(len(tokens))] == list(fresh.ends)  # before the shift is applied
+        assert columns(tokens) == columns(fresh)
+
+
+def broken(seed: int) -> str:
+    # a corpus after random edits, unterminated strings and comments and stray characters included
+    text = corpus(seed)
+    for start, end, replacement in edits(text, seed, 40):
+        text = text[:start] + replacement + text[end:]
+    return text + "\n@ $ 0b 1e 'x" + ' "open'
+
+
+@pytest.mark.parametrize("data", [False, True])
+@pytest.mark.parametrize("seed", range(6))
+def test_engines_agree(seed, data):
+    text = broken(seed)
+    code = info.SourceCode("<test>", None, data=text.encode("utf-8")) if data else info.SourceCode("<test>", text)
+    scanner = lexer.tokenize(code, lexer.LexEngine.Scanner).tokens
+    pattern = lexer.tokenize(code, lexer.LexEngine.Pattern).tokens
+    assert columns(pattern) == columns(scanner)
+
+
+def stitched(code, chunk_size: int, engine):
+    # what tokenize_parallel puts together, with the chunks lexed in this process
+    text = code.text if code.text is not None else code.data
+    bounds = [0, *lexer.split_points(text, chunk_size), len(text)]
+    tokens = lexer.TokenBuffer(code)
+    for idx, (begin, end) in enumerate(zip(bounds, bounds[1:])):
+        kinds, tags, starts, ends = lexer.lex_chunk(text[begin:end], begin, idx == len(bounds) - 2, engine)
+        tokens.kinds += kinds
+        tokens.tags += tags
+        tokens.starts += starts
+        tokens.ends += ends
+    return tokens
+
+
+@pytest.mark.parametrize("engine", list(lexer.LexEngine))
+@pytest.mark.parametrize("data", [False, True])
+@pytest.mark.parametrize("seed", range(6))
+def test_chunks_stitch_to_tokenize(seed, data, engine):
+    text = broken(seed) + "/* a doc comment\nacross\nlines */\nx := 1;\n" * 3
+    code = info.SourceCode("<test>", None, data=text.encode("utf-8")) if data else info.SourceCode("<test>", text)
+    for chunk_size in (16, 100, 700):
+        assert columns(stitched(code, chunk_size, engine)) == columns(lexer.tokenize(code, engine).tokens)
+
+
+def test_tokenize_parallel_matches_tokenize():
+    code = info.SourceCode("<test>", broken(0) * 4)
+    sink, parallel_sink = diagnostics.DiagnosticSink(), diagnostics.DiagnosticSink()
+    parallel = lexer.tokenize_parallel(code, jobs=2, chunk_size=256, sink=parallel_sink).tokens
+    assert columns(parallel) == columns(lexer.tokenize(code, sink=sink).tokens)
+    assert parallel_sink.diagnostics == sink.diagnostics
@@ -0,0 +1,46 @@
+import pytest
+
+from conftest import corpus, edits, module
+
+info = module("info")
+lexer = module("lexer")
+nodes = module("nodes")
+parse = module("parse")
+
+
+def parse_numbers(text: str):
+    result = parse.build_ast(lexer.tokenize(info.SourceCode("<test>", text)))
+    values = [n.data.value for n in nodes.iter_tree(result.ast) if n.type in (nodes.NodeType.Integer, nodes.NodeType.Float)]
+    return values, [d.type for d in result.diagnostics]
+
+
+@pytest.mark.parametrize("text, value", [("1_", 1), ("0x1_", 1), ("0b1_", 1), ("1.5_", 1.5), ("1_.5", 1.5)])
+def test_trailing_separator_is_reported(text, value):
+    assert parse_numbers(f"x :: {text};") == ([value], [parse.DiagnosticType.IncompleteNumber])
+
+
+@pytest.mark.parametrize("text, value", [("1_000", 1000), ("0xff_ff", 0xffff), ("0b1_0", 2), ("1_0.2_5", 10.25)])
+def test_separators_between_digits(text, value):
+    assert parse_numbers(f"x :: {text};") == ([value], [])
+
+
+def outline(result, load: bool = True):
+    # load=False leaves the bodies of an outline parse unparsed
+    shape = [(n.type, n.range.start, n.range.end) for n in nodes.iter_tree(result.ast, load=load)]
+    return shape, [(d.type, d.range.start, d.range.end) for d in result.diagnostics]
+
+
+@pytest.mark.parametrize("outline_mode", [False, True])
+@pytest.mark.parametrize("seed", range(6))
+def test_reparse_matches_build_ast(seed, outline_mode):
+    text = corpus(seed)
+    lex_result = lexer.tokenize(info.SourceCode("<test>", text))
+    result = parse.build_ast(lex_result, outline=outline_mode)
+    for start, end, replacement in edits(text, seed, 20):
+        lex_result = lexer.relex(lex_result, start, end, replacement)
+        result = parse.reparse(result, lex_result, start, end, len(replacement))
+        text = text[:start] + replacement + text[end:]
+        result.settle()
+        fresh = parse.build_ast(lexer.tokenize(info.SourceCode("<test>", text)), outline=outline_mode)
+        assert outline(result, load=False) == outline(fresh, load=False)
+    assert outline(result) == outline(fresh)
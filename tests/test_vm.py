@@ -0,0 +1,51 @@
+import pytest
+
+from conftest import module
+
+bytecode = module("bytecode")
+info = module("info")
+lexer = module("lexer")
+nodes = module("nodes")
+parse = module("parse")
+vm = module("vm")
+
+Depth = 5000  # far deeper than the interpreter stack allows to recurse
+
+
+def compile(text: str):
+    return bytecode.compile_program(parse.build_ast(lexer.tokenize(info.SourceCode("<test>", text))).ast)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1 + (" * Depth + "1" + ")" * Depth, Depth + 1),
+    ("x - (" * Depth + "0" + ")" * Depth, 0),
+    ("- (" * Depth + "1" + ")" * Depth, 1),
+    ("(" * Depth + "x" + ")" * Depth, 1),
+    ("(" + "x = (" * Depth + "x + 1" + ")" * Depth + ")", 2),
+    ("1 < 2 && (" * Depth + "x == 1" + ")" * Depth, True),
+])
+def test_deeply_nested_expression(text, expected):
+    program = compile(f"f :: () -> i64 {{ x := 1; return {text}; }}")
+    assert program.diagnostics == []
+    assert vm.run(program, "f") == expected
+
+
+def test_deeply_nested_global():
+    program = compile("x : i64 = 1; g : i64 = " + "x + (" * Depth + "1" + ")" * Depth + "; f :: () -> i64 { return g; }")
+    assert program.diagnostics == []
+    assert vm.run(program, "f") == Depth + 1
+
+
+def test_deeply_nested_blocks():
+    # built here, the parser itself recurses into blocks
+    ast = parse.build_ast(lexer.tokenize(info.SourceCode("<test>", "f :: () -> i64 { x := 1; { x = x + 1; } return x; }"))).ast
+    outer = ast.data.globals[0].data.value.data.block
+    block = outer.data.statements[1]
+    for _ in range(Depth):
+        wrapper = nodes.Node(nodes.NodeType.Block, block.range)
+        wrapper.data.statements = [block.data.statements[0], block]
+        block = wrapper
+    outer.data.statements[1] = block
+    program = bytecode.compile_program(ast)
+    assert program.diagnostics == []
+    assert vm.run(program, "f") == Depth + 2
@@ -2,7 +2,7 @@
 from dataclasses import dataclass
 from enum import Enum, auto
 
-from .info import SourceLocation, SourceRange
+from .info import SourceRange
 
 
 class TokenType(Enum):
@@ -109,19 +109,12 @@ class TokenTag(Enum):
 class Token():
     type: TokenType
     lexeme: str
-    start: SourceLocation
+    start: int  # offset into SourceCode.text
     tag: TokenTag = None
+    symbol: int = None  # id in SourceCode.symbols, identifiers and strings only
 
     def __len__(self):
         return len(self.lexeme)
 
     def to_range(self):
-        if self.type is TokenType.DocComment and self.lexeme.count("\n"):
-            return SourceRange(self.start, SourceLocation(
-                self.start.line + self.lexeme.count("\n"),
-                len(self.lexeme.split("\n")[-1])
-            ))
-        return SourceRange(self.start, SourceLocation(
-            self.start.line,
-            self.start.column + len(self)
-        ))
\ No newline at end of file
+        return SourceRange(self.start, self.start + len(self.lexeme))
\ No newline at end of file
@@ -0,0 +1,181 @@
+import math
+import operator
+
+from .bytecode import Function, Op, Program
+
+
+class ExecutionError(Exception):
+    # a run time error of the program, offset is where in its source it happened
+    def __init__(self, message: str, function: str = None, offset: int = None):
+        super().__init__(message)
+        self.function = function
+        self.offset = offset
+
+
+def divide(x, y):
+    if type(x) is int and type(y) is int:
+        quotient = abs(x) // abs(y)  # truncated towards zero, as constants are
+        return -quotient if (x < 0) != (y < 0) else quotient
+    return x / y
+
+
+def modulo(x, y):
+    if type(x) is int and type(y) is int:
+        return x - y * divide(x, y)
+    return math.fmod(x, y)
+
+
+def shift_left(x, count):
+    # ints are exact between the stores that wrap them, a count past any width would only build huge ones
+    if not 0 <= count < 64:
+        raise ValueError("shift count out of range")
+    return x << count
+
+
+def shift_right(x, count):
+    if not 0 <= count < 64:
+        raise ValueError("shift count out of range")
+    return x >> count
+
+
+def rotate(bits: int, signed: bool, left: bool):
+    mask = (1 << bits) - 1
+    sign = 1 << (bits - 1)
+
+    def run(x, count):
+        count = count % bits if left else -count % bits
+        pattern = x & mask
+        pattern = (pattern << count | pattern >> (bits - count)) & mask
+        return pattern - (pattern & sign) * 2 if signed else pattern
+    return run
+
+
+Binary = [None] * Op.Binary  # by opcode, see Op
+Binary[Op.Add] = operator.add
+Binary[Op.Subtract] = operator.sub
+Binary[Op.Multiply] = operator.mul
+Binary[Op.Divide] = divide
+Binary[Op.Modulo] = modulo
+Binary[Op.BitAnd] = operator.and_
+Binary[Op.BitOr] = operator.or_
+Binary[Op.BitXOr] = operator.xor
+Binary[Op.ShiftLeft] = shift_left
+Binary[Op.ShiftRight] = shift_right
+Binary[Op.Equals] = operator.eq
+Binary[Op.NotEquals] = operator.ne
+Binary[Op.Less] = operator.lt
+Binary[Op.LessEquals] = operator.le
+Binary[Op.Greater] = operator.gt
+Binary[Op.GreaterEquals] = operator.ge
+for idx, bits in enumerate(Op.RotateWidths):
+    for signed in (False, True):
+        Binary[Op.RotateLeft + 2 * idx + signed] = rotate(bits, signed, True)
+        Binary[Op.RotateRight + 2 * idx + signed] = rotate(bits, signed, False)
+Binary = tuple(Binary)
+
+
+class Machine():
+    # runs the functions of a program; calls between them switch frames inside one loop instead of recursing,
+    # so the depth of a Biskuit call chain is only bounded by max_depth
+    def __init__(self, program: Program, max_depth: int = 1 << 16):
+        self.program = program
+        self.globals = list(program.globals)
+        self.max_depth = max_depth
+        self.initialized = False
+
+    def call(self, name: str, *args):
+        # the global definitions are evaluated before the first call
+        if not self.initialized:
+            self.initialized = True
+            self.execute(self.program.init, [])
+        slot = self.program.slots.get(name)
+        if slot is None:
+            raise ExecutionError(f"no global {name}")
+        callee = self.globals[slot]
+        if type(callee) is not Function:
+            raise ExecutionError(f"{name} is not a function")
+        return self.execute(callee, list(args))
+
+    def execute(self, function: Function, args: list):
+        binary, globals, frames, max_depth = Binary, self.globals, [], self.max_depth
+        BINARY, MOVE, LOAD_GLOBAL, STORE_GLOBAL = Op.Binary, Op.Move, Op.LoadGlobal, Op.StoreGlobal
+        JUMP_IF_FALSE, JUMP_IF_TRUE, NEGATE, NOT, INVERT = Op.JumpIfFalse, Op.JumpIfTrue, Op.Negate, Op.Not, Op.Invert
+        WRAP, CALL, RETURN, RETURN_NONE = Op.Wrap, Op.Call, Op.Return, Op.ReturnNone
+
+        regs = frame(function, args)
+        instructions, pc = function.instructions or decode(function), 0
+        try:
+            while True:
+                # the most frequent instructions are tested first
+                op, a, b, c = instructions[pc]
+                pc += 1
+                if op < BINARY:
+                    regs[a] = binary[op](regs[b], regs[c])
+                elif op == MOVE:
+                    regs[a] = regs[b]
+                elif op == JUMP_IF_FALSE:
+                    if not regs[a]:
+                        pc = b
+                elif op == JUMP_IF_TRUE:
+                    if regs[a]:
+                        pc = b
+                elif op == LOAD_GLOBAL:
+                    regs[a] = globals[b]
+                elif op == CALL:
+                    callee = regs[b]
+                    args = regs[b + 1 : b + 1 + c]
+                    if type(callee) is Function:
+                        if len(frames) >= max_depth:
+                            raise ExecutionError(f"call depth exceeds {max_depth}", function.name, function.offsets[pc - 1])
+                        frames.append((function, instructions, regs, pc, a))
+                        regs = args + callee.initial if c == callee.parameters else frame(callee, args)
+                        function, instructions, pc = callee, callee.instructions or decode(callee), 0
+                    elif callable(callee):
+                        regs[a] = callee(*args)
+                    else:
+                        raise ExecutionError(f"{type(callee).__name__} is not callable", function.name, function.offsets[pc - 1])
+                elif op == RETURN or op == RETURN_NONE:
+                    value = regs[a] if op == RETURN else None
+                    if not frames:
+                        return value
+                    function, instructions, regs, pc, a = frames.pop()
+                    regs[a] = value
+                elif op == WRAP:
+                    value = regs[a] & ((1 << b) - 1)
+                    if c and value >> (b - 1):
+                        value -= 1 << b
+                    regs[a] = value
+                elif op == STORE_GLOBAL:
+                    globals[a] = regs[b]
+                elif op == NEGATE:
+                    regs[a] = -regs[b]
+                elif op == NOT:
+                    regs[a] = not regs[b]
+                elif op == INVERT:
+                    regs[a] = ~regs[b]
+                else:  # Fail
+                    raise ExecutionError(regs[a], function.name, function.offsets[pc - 1])
+        except (ArithmeticError, TypeError, ValueError) as e:
+            raise ExecutionError(str(e), function.name, function.offsets[pc - 1]) from e
+
+
+def decode(function: Function) -> list[tuple[int, int, int, int]]:
+    # unpacking one tuple per instruction is cheaper than four reads from the array
+    code = function.code
+    function.instructions = list(zip(code[0::4], code[1::4], code[2::4], code[3::4]))
+    return function.instructions
+
+
+def frame(function: Function, args: list) -> list:
+    # the registers of a call, parameters first
+    given = len(args)
+    if given != function.parameters:
+        missing = function.parameters - given
+        if missing < 0 or missing > len(function.defaults):
+            raise ExecutionError(f"{function.name} takes {function.parameters} arguments, {given} given", function.name)
+        args += function.defaults[len(function.defaults) - missing:]
+    return args + function.initial
+
+
+def run(program: Program, name: str, *args):
+    return Machine(program).call(name, *args)
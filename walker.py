@@ -1,13 +1,73 @@
+from enum import Enum, auto
+from functools import cache
 
-from dataclasses import dataclass
+from .nodes import FieldKind, Node, NodeType, field_kinds
 
-from .nodes import Node
 
+class Walk(Enum):
+    Continue = auto()  # same as returning None
+    Skip = auto()  # children are not visited, the leave hook still runs
+    Stop = auto()  # ends the walk, no more hooks run
 
-@dataclass(slots=True)
-class TypeCheckResult():
-    pass
 
+@cache
+def child_fields(type: type) -> tuple[tuple[str, bool], ...]:
+    # (name, is_list) of the fields holding nodes, in declaration order
+    return tuple((name, kind is FieldKind.NodeList) for name, kind in field_kinds(type) if kind is not FieldKind.Value)
+
+
+class Visitor():
+    # hooks are methods named enter_<Kind> / leave_<Kind> after the node classes without the underscore
+    # (enter_Alias, leave_Block, ...); a hook for a base class such as enter_BinOp covers all its subclasses,
+    # enter / leave catch every kind left over; all of it is resolved once per Visitor class
+    enter = None
+    leave = None
+
+    @classmethod
+    @cache
+    def dispatch(cls) -> tuple[dict, dict]:
+        tables = ({}, {})
+        for kind in dict.fromkeys(value for name, value in vars(NodeType).items() if not name.startswith("_")):
+            for table, prefix in zip(tables, ("enter", "leave")):
+                for base in kind.__mro__[:-1]:
+                    hook = getattr(cls, f"{prefix}_{base.__name__.lstrip('_')}", None)
+                    if hook is not None:
+                        break
+                else:
+                    hook = getattr(cls, prefix)
+                if hook is not None:
+                    table[kind] = hook
+        return tables
+
+    def walk(self, root: Node):
+        # depth first, pre order for enter and post order for leave; an explicit stack, so neither deep
+        # blocks nor long operator chains recurse
+        enter, leave = self.dispatch()
+        stack: list[tuple[Node, bool]] = [(root, False)]
+        while stack:
+            node, left = stack.pop()
+            kind = node.type
+            if left:
+                if leave[kind](self, node) is Walk.Stop:
+                    return False
+                continue
+
+            action = enter[kind](self, node) if kind in enter else None
+            if action is Walk.Stop:
+                return False
+            if kind in leave:
+                stack.append((node, True))
+            if action is Walk.Skip:
+                continue
+
+            data = node.data
+            for name, is_list in reversed(child_fields(kind)):
+                value = getattr(data, name)
+                if value is None:
+                    continue
+                if is_list:
+                    stack.extend((child, False) for child in reversed(value))
+                else:
+                    stack.append((value, False))
+        return True
 
-def check_type(ast: Node):
-    return TypeCheckResult()
\ No newline at end of file